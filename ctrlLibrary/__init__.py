@@ -15,11 +15,14 @@ u"""=================================================
 # Standard Modules
 import os
 from functools import partial
-import shutil
+from contextlib import contextmanager
+from collections import OrderedDict
 import json
+import fnmatch
 
 # Maya Modules
 import pymel.core as pm
+import maya.cmds as cmds
 import maya.OpenMaya as OpenMaya
 
 # Local Modules
@@ -30,7 +33,16 @@ from maglev.lib import position
 from maglev.lib import controller
 from maglev.util import optionvar
 
-import maglev.icons as icon
+from . import curvedata
+from . import layout
+from . import atlas
+from . import naming
+from . import palette
+from . import cvmath
+from . import shapestore
+from . import fileutil
+from . import raster
+from . import pngio
 
 ui = partial(widget.uiName, __name__.replace('.', '_'))
 callback = partial(widget.callback, __name__)
@@ -43,6 +55,223 @@ def main():
     win.show()
 
 
+def build_controls(nodes, shape, method='create', naming='ReelFX',
+                   color=None, color_at='transform', override=True,
+                   hierarchy=False, node_type=None, depth=None, exclude=None,
+                   rgb=None):
+    """Build controllers without the window, e.g. from mayapy.
+
+    Args:
+        nodes (list): nodes to build controllers on, world origin if empty
+        shape (string): shape ID of the ShapeRegistry
+        method (string): 'create' or 'replace'
+        naming (string): 'Original' or a convention of the naming rules,
+            'ReelFX' by default
+        color (int): override color index, None to leave the color as is
+        color_at (string): 'transform' or 'shape'
+        override (bool): False disables the color override instead
+        hierarchy (bool): also build on the descendants of nodes
+        node_type (string): only build on descendants of this type
+        depth (int): number of levels to descend below nodes
+        exclude (list): name patterns of descendants to skip
+        rgb (list): override color as [r, g, b] from 0 to 1, used instead
+            of the color index
+
+    Returns:
+        list: names of the controllers built or replaced
+    """
+    settings = BuildSettings(method=method,
+                             hierarchy=hierarchy,
+                             naming=naming,
+                             color=color,
+                             color_at=color_at,
+                             override=override,
+                             rgb=rgb)
+    builder = ControlBuilder()
+    selection = builder.element.get_selections(nodes,
+                                               settings.selection_type(),
+                                               node_type=node_type,
+                                               max_depth=depth,
+                                               exclude=exclude)
+    return builder.build(shape, selection, settings)
+
+
+def apply_colors(nodes, color=None, color_at='transform', override=True,
+                 rgb=None):
+    """Set the override color of many nodes at once without the window.
+
+    Args:
+        nodes (list): transforms to color
+        color (int): override color index
+        color_at (string): 'transform' or 'shape'
+        override (bool): False disables the color override instead
+        rgb (list): override color as [r, g, b] from 0 to 1
+
+    Returns:
+        list: names of the transforms or shapes colored
+    """
+    settings = BuildSettings(color=color,
+                             color_at=color_at,
+                             override=override,
+                             rgb=rgb)
+    return ControlBuilder().apply_color_value(target=list(nodes),
+                                              settings=settings)
+
+
+def render_icons(jobs=None, width=32, height=32, force=False):
+    """Render controller icons in one session without the window, e.g.
+    from mayapy.
+
+    Args:
+        jobs (list): [shape ID, icon path] to render, every missing or
+            stale icon of the library by default
+        width (int): icon width
+        height (int): icon height
+        force (bool): render every icon of the library when jobs is None
+
+    Returns:
+        tuple: paths of the icons written and IDs of the shapes that
+            could not be rendered
+    """
+    if jobs is None:
+        jobs = IconLayoutIO().getIconJobs(force=force)
+    return IconRenderer(width, height).render(jobs)
+
+
+def transform_controls(nodes, rotate=None, scale=None, matrix=None,
+                       pivot='objectCenter', order='xyz'):
+    """Scale, rotate and transform the shapes of many controls at once
+    without the window, as a single undo step.
+
+    Args:
+        nodes (list): controls whose curve shapes are edited
+        rotate (list): euler angles in degrees
+        scale (list): scale of each axis
+        matrix (list): 4x4 matrix, as rows or 16 values, applied last
+        pivot (string): 'objectCenter' or 'objectPivot'
+        order (string): rotation order of the euler angles
+
+    Returns:
+        list: curve shapes edited
+    """
+    matrix = cvmath.compose(scale=scale, rotate=rotate, matrix=matrix, order=order)
+    return EditControlShape().transform_shapes(nodes, matrix, pivot)
+
+
+def auto_color(root=None, scheme='default', by='auto',
+               color_at='transform', tolerance=0.001):
+    """Color every control under the control group by side without the
+    window.
+
+    Args:
+        root (string): group holding the controls, control_GRP by default
+        scheme (string or dict): scheme of the palette or side -> index
+        by (string): 'name', 'position' or 'auto' to use the position of
+            the controls whose name tells no side
+        color_at (string): 'transform' or 'shape'
+        tolerance (float): distance to the YZ plane still counted as center
+
+    Returns:
+        dict: side -> controls colored
+    """
+    return ControlBuilder().auto_color_controls(root=root,
+                                                scheme=scheme,
+                                                by=by,
+                                                color_at=color_at,
+                                                tolerance=tolerance)
+
+
+def rename_controls(nodes, naming='ReelFX'):
+    """Rename nodes to the names given by a convention of the naming rules.
+
+    The names are derived in one batch and made unique against a single
+    snapshot of the scene, the renames being one undo step. Nodes are
+    renamed deepest first so that the long names of the nodes still to be
+    renamed stay valid. With 'Original' the nodes keep their names.
+
+    Returns:
+        list: new names of the nodes, in the order of nodes
+
+    Raises:
+        ValueError: when naming is not a convention of the naming rules
+    """
+    if naming == BuildSettings.ORIGINAL:
+        return list(nodes)
+    # fail before the scene is queried
+    DefalutValue.rules.get_rules(naming)
+
+    element = ElementUI()
+    allocator = element.get_name_allocator()
+    long_names = [cmds.ls(node, long=True)[0] for node in nodes]
+    short_names = [node.rpartition('|')[2] for node in long_names]
+    for name in short_names:
+        allocator.used.discard(name)
+
+    derived = DefalutValue.rules.derive_all(short_names, naming)
+    names = [allocator.allocate(name) for name in derived]
+    order = sorted(range(len(long_names)),
+                   key=lambda i: long_names[i].count('|'), reverse=True)
+    with undo_chunk():
+        for i in order:
+            names[i] = cmds.rename(long_names[i], names[i])
+    return names
+
+
+def iter_hierarchy(root, node_type=None, max_depth=None, exclude=None):
+    """Yield root and its descendants parent first, one level of children
+    queried at a time.
+
+    Args:
+        root (string): long name of the root node
+        node_type (string): only yield nodes of this type, e.g. 'joint'
+        max_depth (int): number of levels to descend below root
+        exclude (list): fnmatch patterns of short names to skip together
+            with everything below them
+    """
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        short_name = node.rpartition('|')[2]
+        if exclude and any(fnmatch.fnmatchcase(short_name, p) for p in exclude):
+            continue
+
+        if node_type is None or cmds.objectType(node, isAType=node_type):
+            yield node
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        children = cmds.listRelatives(node, children=True, fullPath=True) or []
+        stack.extend((child, depth + 1) for child in reversed(children))
+
+
+@contextmanager
+def undo_chunk():
+    """Group every command run inside the block into a single undo step
+    and suspend viewport refresh while it runs.
+    """
+    pm.undoInfo(openChunk=True)
+    pm.refresh(suspend=True)
+    try:
+        yield
+    finally:
+        pm.refresh(suspend=False)
+        pm.undoInfo(closeChunk=True)
+
+
+def get_user_dir():
+    """Return the directory of the per-user caches of the library under
+    the Maya application directory, created on first use.
+    """
+    dirPath = os.path.join(pm.internalVar(userAppDir=True), "ctrlLibrary")
+    if not os.path.isdir(dirPath):
+        try:
+            os.makedirs(dirPath)
+        except OSError:
+            if not os.path.isdir(dirPath):
+                raise
+    return dirPath
+
+
 class Window(object):
 
     def __init__(self):
@@ -55,6 +284,7 @@ class Window(object):
         self.builder = ControlBuilder()
         self.element = ElementUI()
         self.edit = EditControlShape()
+        self.iconLayout = IconLayoutIO()
 
     def exist(self):
         if pm.window(self.win, q=True, ex=True):
@@ -100,12 +330,25 @@ class Window(object):
                     c=callback('rigging.freezeTrans'))
         pm.menuItem(label='DeleteHistory',
                     c=callback('rigging.deleteHistory'))
+        pm.menuItem(divider=True)
+        pm.menuItem(label='Reset Shape Cache',
+                    c=lambda *args: (ShapeCache().clear()))
+        pm.menuItem(label='Pack Icon Atlas',
+                    c=lambda *args: (IconLayoutIO().updateAtlas()))
+        pm.menuItem(label='Render Missing Icons',
+                    c=lambda *args: (IconLayoutIO().renderIcons()))
+        pm.menuItem(label='Auto Color Sides',
+                    c=lambda *args: (self.builder.auto_color_controls()))
         pm.menu(label='Name', tearOff=False)
         pm.radioMenuItemCollection(ui('nameRadioItem'))
         pm.menuItem(ui('menuRadioA'), l='ReelFX',
                     cl=ui('nameRadioItem'), rb=True)
         pm.menuItem(ui('menuRadioB'), l='Original',
                     cl=ui('nameRadioItem'), rb=False)
+        for convention in DefalutValue.rules.conventions():
+            if convention != BuildSettings.REELFX:
+                pm.menuItem(ui('menuRadio_' + convention), l=convention,
+                            cl=ui('nameRadioItem'), rb=False)
 
         return menu
 
@@ -167,82 +410,8 @@ class Window(object):
         pm.columnLayout('MakeMasterCL',
                         bgc=self.frame_layout_bgc,
                         w=152)
-        
-        # iconLayout = IconLayoutIO()
-        # iconLayout.generateTab()
-
-        tab = pm.tabLayout(imw=5,
-                           imh=5,
-                           p='MakeMasterCL')
-        child1 = pm.rowColumnLayout(w=250, nc=7)
-
-        self.element.create_icon_button('circleNormal', 'make_circle_normal')
-        self.element.create_icon_button('circleCross', 'make_cross_circle')
-        self.element.create_icon_button('circleWave', 'make_circle_wave')
-        self.element.create_icon_button('circleHalf', 'make_circle_half')
-        self.element.create_icon_button('circleQuarter', 'make_circle_quarter')
-        self.element.create_icon_button('circleDoubleHalf', 'make_circle_double_half')
-        self.element.create_icon_button('circleDoubleQuarter', 'make_circle_double_quarter')
-        self.element.create_icon_button('makeSquare01', 'make_square_01')
-        self.element.create_icon_button('makeSquareX01', 'make_square_x_01')
-        self.element.create_icon_button('makeSquare02', 'make_square_02')
-        self.element.create_icon_button('makeTriangle02', 'make_triangle_02')
-        self.element.create_icon_button('makeTriangle01', 'make_triangle_01')
-        self.element.create_icon_button('crossA', 'make_crossA')
-        self.element.create_icon_button('crossB', 'make_crossB')
-        self.element.create_icon_button('hexagonA', 'make_hexagonA')
-        self.element.create_icon_button('starA', 'make_star01')
-        self.element.create_icon_button('makeNail01', 'make_nail_01')
-        self.element.create_icon_button('makeFace01', 'make_face_01')
-        self.element.create_icon_button('makeFoot01', 'make_foot')
-        self.element.create_icon_button('makeEyes01', 'make_eyes_01')
-        pm.setParent('..')
-
-        child2 = pm.rowColumnLayout(w=250, nc=7)
-        self.element.create_icon_button('makeBall01', 'make_ball_01')
-        self.element.create_icon_button('makeSphereArrow02', 'make_sphere_arrow_02')
-        self.element.create_icon_button('halfBall', 'make_half_ball')
-        self.element.create_icon_button('makeCircleDir', 'make_circle_dir')
-        self.element.create_icon_button('makeCube01', 'make_cube_01')
-        self.element.create_icon_button('makeCylinder01', 'make_cylinder_01')
-        self.element.create_icon_button('makeCylinder02', 'make_cylinder_02')
-        self.element.create_icon_button('makeCylinder03', 'make_cylinder_03')
-        self.element.create_icon_button('makePyramid01', 'make_pyramid_01')
-        self.element.create_icon_button('makeHalfPyramid01', 'make_half_pyramid_01')
-        self.element.create_icon_button('makeRumbus01', 'make_rumbus_01')
-        self.element.create_icon_button('makePyramid01', 'make_pyramid_01')
-        self.element.create_icon_button('makeCone01', 'make_cone_01')
-        self.element.create_icon_button('makeSphereArrow01', 'make_sphere_arrow_01')
-        self.element.create_icon_button('makeBigArrow01', 'make_big_arrow_01')
-        self.element.create_icon_button('makeCapsule01', 'make_capsule_01')
-        self.element.create_icon_button('chestBox', 'make_chest_box')
-        pm.setParent('..')
-
-        child3 = pm.rowColumnLayout(w=250, nc=7)
-        self.element.create_icon_button('makeArrow01', 'make_arrow_01')
-        self.element.create_icon_button('makeArrow02', 'make_arrow_02')
-        self.element.create_icon_button('makeArrow06', 'make_arrow_06')
-        self.element.create_icon_button('makeArrow07', 'make_arrow_07')
-        self.element.create_icon_button('makeArrow08', 'make_arrow_08')
-        self.element.create_icon_button('makeArrow09', 'make_arrow_09')
-        self.element.create_icon_button('makeArrow10', 'make_arrow_10')
-        self.element.create_icon_button('makeArrow11', 'make_arrow_11')
-        self.element.create_icon_button('makeArrow13', 'make_arrow_13')
-        self.element.create_icon_button('makeArrow14', 'make_arrow_14')
-        self.element.create_icon_button('makeArrow15', 'make_arrow_15')
-        self.element.create_icon_button('makeArrow16', 'make_arrow_16')
-        self.element.create_icon_button('circleArrow', 'make_circle_arrow')
-        self.element.create_icon_button('circleAllDir', 'make_circle_all_dir')
-        self.element.create_icon_button('circleArrowTwoA', 'make_circle_arrow_twoA')
-        self.element.create_icon_button('circleArrowTwoB', 'make_circle_arrow_twoB')
-        self.element.create_icon_button('arrowSquere01', 'make_world_arrow')
 
-        pm.setParent('..')
-        pm.tabLayout(tab,
-                     edit=True,
-                     tabLabel=((child1, ' 2Dshape  '),
-                               (child2, ' 3Dshape  '),
-                               (child3, '  Direction   ')))
+        self.iconLayout.generateTab(self.builder)
 
         pm.rowColumnLayout('otherRCL',
                            nc=2,
@@ -316,6 +485,24 @@ class Window(object):
                   bgc=self.button_bgc,
                   h=35,
                   c=lambda *args: (self.edit.scale_ctrl_shape('down')))
+        pm.rowColumnLayout('numericRCL',
+                           nc=1,
+                           cw=[(1, 255)],
+                           p="TransformsMasterCL")
+        pm.floatFieldGrp(ui('rotateFFG'),
+                         nf=3,
+                         l='Rotate:',
+                         cw4=[60, 65, 65, 65],
+                         v1=0.0, v2=0.0, v3=0.0)
+        pm.floatFieldGrp(ui('scaleFFG'),
+                         nf=3,
+                         l='Scale:',
+                         cw4=[60, 65, 65, 65],
+                         v1=1.0, v2=1.0, v3=1.0)
+        pm.button(label='Apply',
+                  bgc=self.button_bgc,
+                  h=25,
+                  c=lambda *args: (self.edit.apply_numeric_transform()))
         pm.separator(height=1, style='none')
         pm.rowColumnLayout('otherRCL',
                            nc=2,
@@ -335,7 +522,7 @@ class Window(object):
         pm.frameLayout('colorFL', label="Color Palette", bgc=self.frame_bgc,
                        cl=True, w=262, mh=2, mw=2, p='ctrlMasterCL')
         pm.columnLayout('colorMasterCL',
-                        bgc=self.frame_layout_bgc, w=280, h=120)
+                        bgc=self.frame_layout_bgc, w=280, h=145)
         pm.radioButtonGrp(ui('colorPlaceAtRBG'),
                           nrb=2,
                           l='Color At:',
@@ -349,68 +536,9 @@ class Window(object):
 
         pm.iconTextButton(nbg=True, l="x", style='iconAndTextCentered', flat=True,
                           c=lambda *args: (self.element.change_color_button_name()), p='colorGL')
-        pm.iconTextButton(bgc=[0.467, 0.467, 0.467],
-                          c=lambda *args: (self.element.set_slider_value(0)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 0.000, 0.000],
-                          c=lambda *args: (self.element.set_slider_value(1)), p='colorGL')
-        pm.iconTextButton(bgc=[0.247, 0.247, 0.247],
-                          c=lambda *args: (self.element.set_slider_value(2)), p='colorGL')
-        pm.iconTextButton(bgc=[0.498, 0.498, 0.498],
-                          c=lambda *args: (self.element.set_slider_value(3)), p='colorGL')
-        pm.iconTextButton(bgc=[0.608, 0.000, 0.157],
-                          c=lambda *args: (self.element.set_slider_value(4)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 0.016, 0.373],
-                          c=lambda *args: (self.element.set_slider_value(5)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 0.000, 1.000],
-                          c=lambda *args: (self.element.set_slider_value(6)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 0.275, 0.094],
-                          c=lambda *args: (self.element.set_slider_value(7)), p='colorGL')
-        pm.iconTextButton(bgc=[0.145, 0.000, 0.263],
-                          c=lambda *args: (self.element.set_slider_value(8)), p='colorGL')
-        pm.iconTextButton(bgc=[0.780, 0.000, 0.780],
-                          c=lambda *args: (self.element.set_slider_value(9)), p='colorGL')
-        pm.iconTextButton(bgc=[0.537, 0.278, 0.200],
-                          c=lambda *args: (self.element.set_slider_value(10)), p='colorGL')
-        pm.iconTextButton(bgc=[0.243, 0.133, 0.122],
-                          c=lambda *args: (self.element.set_slider_value(11)), p='colorGL')
-        pm.iconTextButton(bgc=[0.600, 0.145, 0.001],
-                          c=lambda *args: (self.element.set_slider_value(12)), p='colorGL')
-        pm.iconTextButton(bgc=[1.000, 0.000, 0.000],
-                          c=lambda *args: (self.element.set_slider_value(13)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 1.000, 0.000],
-                          c=lambda *args: (self.element.set_slider_value(14)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 0.255, 0.600],
-                          c=lambda *args: (self.element.set_slider_value(15)), p='colorGL')
-        pm.iconTextButton(bgc=[1.000, 1.000, 1.000],
-                          c=lambda *args: (self.element.set_slider_value(16)), p='colorGL')
-        pm.iconTextButton(bgc=[1.000, 1.000, 0.000],
-                          c=lambda *args: (self.element.set_slider_value(17)), p='colorGL')
-        pm.iconTextButton(bgc=[0.388, 0.863, 1.000],
-                          c=lambda *args: (self.element.set_slider_value(18)), p='colorGL')
-        pm.iconTextButton(bgc=[0.263, 1.000, 0.635],
-                          c=lambda *args: (self.element.set_slider_value(19)), p='colorGL')
-        pm.iconTextButton(bgc=[1.000, 0.686, 0.686],
-                          c=lambda *args: (self.element.set_slider_value(20)), p='colorGL')
-        pm.iconTextButton(bgc=[0.890, 0.675, 0.475],
-                          c=lambda *args: (self.element.set_slider_value(21)), p='colorGL')
-        pm.iconTextButton(bgc=[1.000, 1.000, 0.384],
-                          c=lambda *args: (self.element.set_slider_value(22)), p='colorGL')
-        pm.iconTextButton(bgc=[0.000, 0.600, 0.325],
-                          c=lambda *args: (self.element.set_slider_value(23)), p='colorGL')
-        pm.iconTextButton(bgc=[0.627, 0.412, 0.188],
-                          c=lambda *args: (self.element.set_slider_value(24)), p='colorGL')
-        pm.iconTextButton(bgc=[0.620, 0.627, 0.188],
-                          c=lambda *args: (self.element.set_slider_value(25)), p='colorGL')
-        pm.iconTextButton(bgc=[0.408, 0.627, 0.188],
-                          c=lambda *args: (self.element.set_slider_value(26)), p='colorGL')
-        pm.iconTextButton(bgc=[0.188, 0.627, 0.365],
-                          c=lambda *args: (self.element.set_slider_value(27)), p='colorGL')
-        pm.iconTextButton(bgc=[0.188, 0.627, 0.627],
-                          c=lambda *args: (self.element.set_slider_value(28)), p='colorGL')
-        pm.iconTextButton(bgc=[0.188, 0.404, 0.627],
-                          c=lambda *args: (self.element.set_slider_value(29)), p='colorGL')
-        pm.iconTextButton(bgc=[0.435, 0.188, 0.627],
-                          c=lambda *args: (self.element.set_slider_value(30)), p='colorGL')
+        for color_id, rgb in enumerate(palette.COLORS):
+            pm.iconTextButton(bgc=rgb,
+                              c=self.palette_command(color_id), p='colorGL')
         pm.rowColumnLayout('colorPartsRCL',
                            nc=2,
                            cw=[(1, 227), (2, 27)],
@@ -420,6 +548,16 @@ class Window(object):
                                p='colorPartsRCL',
                                cc=lambda *args: (self.element.set_color_value()))
         pm.intField('colorValueInt', value=1, p='colorPartsRCL')
+        pm.rowColumnLayout('colorRGBRCL',
+                           nc=2,
+                           cw=[(1, 50), (2, 204)],
+                           p="colorMasterCL")
+        pm.checkBox(ui('colorRGBCB'), l='RGB', v=False, p='colorRGBRCL')
+        pm.colorSliderGrp(ui('colorRGBCSG'),
+                          rgb=[1.0, 1.0, 0.0],
+                          cw2=[60, 144],
+                          p='colorRGBRCL',
+                          cc=lambda *args: (pm.checkBox(ui('colorRGBCB'), e=True, v=True)))
         pm.button('setColorBtm',
                   label='Set the Color',
                   w=255,
@@ -428,6 +566,9 @@ class Window(object):
                   c=lambda *args: (self.builder.apply_color_value()),
                   p='colorMasterCL')
 
+    def palette_command(self, color_id):
+        return lambda *args: (self.element.set_slider_value(color_id))
+
 
 class RegisterWindow():
 
@@ -533,6 +674,10 @@ class RegisterWindow():
                   bgc=self.button_bgcA,
                   c=lambda *args: (self.func.convertCurveToStroke()),
                   p='iconCL')
+        pm.button(label="Draw Image From CVs", h=20,
+                  bgc=self.button_bgcA,
+                  c=lambda *args: (self.func.drawNewImage()),
+                  p='iconCL')
         pm.formLayout('buttonFL', p="iconCL")
         b1 = pm.button(label="Capture New Image",
                        h=20,
@@ -576,8 +721,9 @@ class RegisterWindow():
                          label="File Type: ",
                          p="optionCL",
                          adj=2)
-        pm.menuItem(label="mayaAscii")
+        pm.menuItem(label="binary")
         pm.menuItem(label="json")
+        pm.menuItem(label="mayaAscii")
         pm.columnLayout('buttonCL',
                         bgc=self.frame_layout_bgc,
                         w=130,
@@ -585,17 +731,303 @@ class RegisterWindow():
                         columnOffset=["both", 2],
                         p="mainCL")
         pm.button(label="Register Curve", h=30,
-                  bgc=self.button_bgc, p='buttonCL')
+                  bgc=self.button_bgc,
+                  c=lambda *args: (self.func.registerCurve()),
+                  p='buttonCL')
+        pm.button(label="Export File", h=20,
+                  bgc=self.button_bgcA,
+                  c=lambda *args: (self.func.export()),
+                  p='buttonCL')
         pm.separator(height=3, style='none')
 
         pm.setParent('..')
 
 
 class DefalutValue():
-    controlGrp = 'control_GRP'
-    con = 'CON'
-    jnt = 'JNT'
-    zero = 'ZERO'
+    rules = naming.NamingRules.load(naming.get_rules_path())
+    controlGrp = rules.tokens['controlGrp']
+    con = rules.tokens['con']
+    jnt = rules.tokens['jnt']
+    zero = rules.tokens['zero']
+
+
+class BuildSettings():
+    """Options of a controller build.
+
+    The window reads them from its widgets with from_ui(), headless builds
+    give them directly so that nothing depends on the UI.
+    """
+
+    CREATE = 'create'
+    REPLACE = 'replace'
+    REELFX = 'ReelFX'
+    ORIGINAL = 'Original'
+    TRANSFORM = 'transform'
+    SHAPE = 'shape'
+
+    def __init__(self, method=CREATE, hierarchy=False, naming=REELFX,
+                 color=None, color_at=TRANSFORM, override=True, rgb=None):
+        self.method = method
+        self.hierarchy = hierarchy
+        self.naming = naming
+        self.color = color
+        self.color_at = color_at
+        self.override = override
+        self.rgb = rgb
+
+    @classmethod
+    def from_ui(cls, element):
+        color_at = {1: cls.TRANSFORM, 2: cls.SHAPE}.get(element.get_color_at())
+
+        return cls(method=[cls.CREATE, cls.REPLACE][element.get_method_type() - 1],
+                   hierarchy=element.get_selection_type() == 2,
+                   naming=element.get_name_type(),
+                   color=element.get_color_value(),
+                   color_at=color_at,
+                   override=element.get_color_button_label() == "Set the Color",
+                   rgb=element.get_color_rgb())
+
+    def has_color(self):
+        return self.color is not None or self.rgb is not None
+
+    def selection_type(self):
+        return 2 if self.hierarchy else 1
+
+
+class ShapeRegistry():
+    """Table of every controller shape the library can build.
+
+    A shape ID maps to the name of a function in the controller module, a
+    callable returning a new curve transform, or a list of curve
+    definitions. Plugins and shapes registered from the Register Window
+    are added to the same table with register().
+    """
+
+    shapes = OrderedDict([
+        ('circleNormal', 'make_circle_normal'),
+        ('circleCross', 'make_cross_circle'),
+        ('circleWave', 'make_circle_wave'),
+        ('circleHalf', 'make_circle_half'),
+        ('circleQuarter', 'make_circle_quarter'),
+        ('circleDoubleHalf', 'make_circle_double_half'),
+        ('circleDoubleQuarter', 'make_circle_double_quarter'),
+        ('square01', 'make_square_01'),
+        ('squareX01', 'make_square_x_01'),
+        ('square02', 'make_square_02'),
+        ('triangle02', 'make_triangle_02'),
+        ('triangle01', 'make_triangle_01'),
+        ('cross01', 'make_crossA'),
+        ('cross02', 'make_crossB'),
+        ('hexagonA', 'make_hexagonA'),
+        ('starA', 'make_star01'),
+        ('nail01', 'make_nail_01'),
+        ('face01', 'make_face_01'),
+        ('foot01', 'make_foot'),
+        ('eyes01', 'make_eyes_01'),
+        ('ball01', 'make_ball_01'),
+        ('sphereArrow02', 'make_sphere_arrow_02'),
+        ('ballHalf', 'make_half_ball'),
+        ('circleDir', 'make_circle_dir'),
+        ('cube01', 'make_cube_01'),
+        ('cylinder01', 'make_cylinder_01'),
+        ('cylinder02', 'make_cylinder_02'),
+        ('cylinder03', 'make_cylinder_03'),
+        ('pyramid01', 'make_pyramid_01'),
+        ('pyramidHalf01', 'make_half_pyramid_01'),
+        ('rumbus01', 'make_rumbus_01'),
+        ('cone01', 'make_cone_01'),
+        ('sphereArrow01', 'make_sphere_arrow_01'),
+        ('locatorArrow01', 'make_big_arrow_01'),
+        ('capsule01', 'make_capsule_01'),
+        ('chestBox', 'make_chest_box'),
+        ('arrow01', 'make_arrow_01'),
+        ('arrowBoth01', 'make_arrow_02'),
+        ('arrowAll02', 'make_arrow_06'),
+        ('arrow03', 'make_arrow_07'),
+        ('arrowBoth03', 'make_arrow_08'),
+        ('arrowAll03', 'make_arrow_09'),
+        ('arrowCircle01', 'make_arrow_10'),
+        ('arrowCircle02', 'make_arrow_11'),
+        ('arrowCircle04', 'make_arrow_13'),
+        ('arrowCircle10', 'make_arrow_14'),
+        ('arrow04', 'make_arrow_15'),
+        ('arrow05', 'make_arrow_16'),
+        ('arrowCircle06', 'make_circle_arrow'),
+        ('arrowAll04', 'make_circle_all_dir'),
+        ('arrowCircleBoth01', 'make_circle_arrow_twoA'),
+        ('arrowCircleBoth02', 'make_circle_arrow_twoB'),
+        ('arrowSquere01', 'make_world_arrow')
+    ])
+
+    def __init__(self):
+        self.cache = ShapeCache()
+
+    @classmethod
+    def register(cls, shape_id, source):
+        """Add a shape to the table, replacing any shape with the same ID.
+
+        Args:
+            shape_id (string): unique name of the shape
+            source (string, callable or list): controller function name,
+                factory callable or curve definitions
+        """
+        cls.shapes[shape_id] = source
+        ShapeCache.definitions.pop(shape_id, None)
+
+    @classmethod
+    def register_file(cls, path):
+        """Add every shape of a binary or json shape file to the table.
+
+        Returns:
+            list: shape IDs registered
+        """
+        definitions = curvedata.load_file(path)
+        for shape_id in sorted(definitions):
+            cls.register(shape_id, definitions[shape_id])
+        return sorted(definitions)
+
+    @classmethod
+    def register_store(cls, store=None):
+        """Add every shape of the shape library store to the table.
+
+        Returns:
+            list: shape IDs registered
+        """
+        store = store or shapestore.ShapeStore()
+        if not store.exists():
+            return []
+        definitions = store.load_all()
+        for shape_id in sorted(definitions):
+            cls.register(shape_id, definitions[shape_id])
+        return sorted(definitions)
+
+    @classmethod
+    def unregister(cls, shape_id):
+        cls.shapes.pop(shape_id, None)
+        ShapeCache.definitions.pop(shape_id, None)
+
+    @classmethod
+    def list_shapes(cls):
+        return list(cls.shapes.keys())
+
+    def get_factory(self, shape_id):
+        source = self.shapes[shape_id]
+        if callable(source):
+            return source
+        if isinstance(source, list):
+            return partial(self.cache.create, source)
+        return getattr(controller, source)
+
+    def get_definition(self, shape_id):
+        """Return the curve definitions of a shape, building them once
+        from its factory when they are not cached yet.
+        """
+        source = self.shapes[shape_id]
+        if isinstance(source, list):
+            return source
+        return self.cache.get(shape_id, self.get_factory(shape_id))
+
+
+class ShapeCache():
+    """Session cache of the curve data behind every controller shape.
+
+    Each shape function is run once, its curves are stored as degree,
+    form, knots and CVs and every later controller is rebuilt straight
+    from that data. The cache is shared by every instance and persisted
+    to shapeCache.json in the user directory so it survives between
+    sessions. The file is stamped with the controller module and ignored
+    once the shape functions have been edited.
+    """
+
+    FILE_NAME = "shapeCache.json"
+    definitions = {}
+    loaded = False
+
+    def __init__(self):
+        self.filePath = self.get_cache_path()
+        if not ShapeCache.loaded:
+            self.load()
+
+    def get_cache_path(self):
+        return os.path.join(get_user_dir(), self.FILE_NAME)
+
+    def get_source_stamp(self):
+        """Return the stamp of the controller module the shapes are built
+        by, or None when it cannot be read.
+        """
+        try:
+            return layout.stamp(controller.__file__)
+        except (AttributeError, OSError):
+            return None
+
+    def load(self):
+        ShapeCache.loaded = True
+        definitions = curvedata.load_cache(self.filePath, self.get_source_stamp())
+        if definitions:
+            self.definitions.update(definitions)
+
+    def save(self):
+        """Write the cache, merged with the shapes other sessions or batch
+        workers saved for the same controller module since it was loaded.
+        """
+        source = self.get_source_stamp()
+        try:
+            with fileutil.lock(self.filePath):
+                saved = curvedata.load_cache(self.filePath, source)
+                if saved:
+                    saved.update(self.definitions)
+                    self.definitions.update(saved)
+                curvedata.dump_cache(self.definitions, self.filePath, source)
+        except Exception as e:
+            print(e)
+
+    def clear(self):
+        self.definitions.clear()
+        if os.path.exists(self.filePath):
+            os.remove(self.filePath)
+
+    def get(self, shape_id, factory):
+        """Return the curve definitions of a shape, running its factory
+        only the first time the shape is requested.
+        """
+        definition = self.definitions.get(shape_id)
+        if definition is None:
+            definition = self.capture(factory(), delete=True, space='world')
+            self.definitions[shape_id] = definition
+            self.save()
+        return definition
+
+    def capture(self, node, delete=False, space='object'):
+        """Return the curve definitions of the curve shapes of node.
+
+        Curves picked by the user are read in object space so that the
+        position of their transform is not baked into the shape.
+        """
+        curves = []
+        for shp in pm.listRelatives(node, s=True, type='nurbsCurve'):
+            curves.append(curvedata.make_curve(shp.degree(),
+                                               shp.getAttr('form'),
+                                               shp.getKnots(),
+                                               shp.getCVs(space=space)))
+        if delete:
+            pm.delete(node)
+        return curves
+
+    def create(self, definition):
+        """Build a controller transform from curve definitions.
+        """
+        ctrl = None
+        for curve in definition:
+            crv = pm.curve(d=curve["degree"],
+                           p=curve["cvs"],
+                           k=curve["knots"],
+                           per=curvedata.is_periodic(curve))
+            if ctrl is None:
+                ctrl = crv
+                continue
+            pm.parent(crv.getShape(), ctrl, s=True, r=True)
+            pm.delete(crv)
+        return ctrl
 
 
 class ElementUI():
@@ -612,45 +1044,84 @@ class ElementUI():
     def get_color_at(self):
         return pm.radioButtonGrp(ui('colorPlaceAtRBG'), q=True, sl=True)
 
-    def get_selections(self):
-        selections = pm.ls(sl=True, l=True)
-        selName = [sel.name() for sel in selections]
-        
-        types = self.get_selection_type()
-        optionvar.write(ui('selectionTypeRC'), types)
+    def get_rotate_values(self):
+        return pm.floatFieldGrp(ui('rotateFFG'), q=True, v=True)
+
+    def get_scale_values(self):
+        return pm.floatFieldGrp(ui('scaleFFG'), q=True, v=True)
+
+    def get_name_type(self):
+        """Return the naming convention checked in the Name menu.
+        """
+        if pm.menuItem(ui('menuRadioA'), q=True, rb=True):
+            return BuildSettings.REELFX
+        for convention in DefalutValue.rules.conventions():
+            item = ui('menuRadio_' + convention)
+            if pm.menuItem(item, exists=True) and pm.menuItem(item, q=True, rb=True):
+                return convention
+        return BuildSettings.ORIGINAL
+
+    def get_selections(self, nodes=None, types=None,
+                       node_type=None, max_depth=None, exclude=None):
+        """Yield the nodes to build controllers on.
+
+        In hierarchy mode each selected node is followed by its descendants
+        parent first, without the last node of the hierarchy.
+        """
+        if nodes is None:
+            nodes = cmds.ls(sl=True, l=True)
+
+        if types is None:
+            types = self.get_selection_type()
+            optionvar.write(ui('selectionTypeRC'), types)
+
         # types is 'selected' mode
-        items = []
         if types == 1:
-            items.extend(selName)
+            for node in nodes:
+                yield node
 
         # types is 'hierarchy' mode
         elif types == 2:
-            for sel in selName:
-                children = pm.listRelatives(sel, ad=True, f=True)
-                sel_items = [child.name() for child in children]
-                sel_items.append(sel)
-                sel_items.reverse()
-
-                sel_items.pop(-1)
-                items.extend(sel_items)
-        return items
+            for node in nodes:
+                items = iter_hierarchy(node,
+                                       node_type=node_type,
+                                       max_depth=max_depth,
+                                       exclude=exclude)
+                previous = next(items, None)
+                for item in items:
+                    yield previous
+                    previous = item
+
+    def get_name_allocator(self):
+        """Return a NameAllocator holding every node name of the scene.
+        """
+        names = [node.rpartition('|')[2] for node in cmds.ls()]
+        return naming.NameAllocator(names)
 
-    def get_name(self, node):
-        name_type = pm.menuItem(ui('menuRadioA'), q=True, rb=True)
+    def get_name(self, node, name_type=None, allocator=None):
+        """Return the controller name of a node in a list.
+
+        name_type is 'Original' or a convention of the naming rules. With an
+        allocator the name is made unique against its snapshot of the scene
+        instead of querying the scene.
+        """
+        if name_type is None:
+            name_type = self.get_name_type()
         ctrl_name = []
 
-        defalut = DefalutValue()
-        if name_type:
+        if name_type != BuildSettings.ORIGINAL:
             split_name = rename.split_vertical_line(node)[0]
-            if defalut.jnt in node:
-                ctrl_name.append(split_name.replace(defalut.jnt, defalut.con))
-            else:
-                name = "{}_{}".format(split_name, defalut.con)
-                ctrl_name.append(name)
+            name = DefalutValue.rules.derive(split_name, name_type)
+            if allocator is not None:
+                name = allocator.allocate(name)
+            ctrl_name.append(name)
         else:
             split_name = rename.split_vertical_line(node)[0]
             renamed_ctrl = rename.compile_id_name(split_name[0], 'ctrl')
-            if pm.objExists(renamed_ctrl):
+            if allocator is not None:
+                template = rename.compile_id_name(split_name[0], 'ctrlBatting@')
+                ctrl_name.append(allocator.allocate(renamed_ctrl, template))
+            elif pm.objExists(renamed_ctrl):
                 renamed_ctrl = rename.compile_id_name(
                     split_name[0], 'ctrlBatting@')
                 ctrl_name.append(rename.get_right_name(renamed_ctrl))
@@ -671,6 +1142,13 @@ class ElementUI():
         color_id = pre_color_id - 1
         return color_id
 
+    def get_color_rgb(self):
+        """Return the RGB override color, or None to use the color index.
+        """
+        if not pm.checkBox(ui('colorRGBCB'), q=True, v=True):
+            return None
+        return list(pm.colorSliderGrp(ui('colorRGBCSG'), q=True, rgb=True))
+
     def set_color_value(self):
         val = self.get_int_value()
         pm.intField('colorValueInt', e=True, value=val)
@@ -684,6 +1162,7 @@ class ElementUI():
                     e=True,
                     value=color_value
                     )
+        pm.checkBox(ui('colorRGBCB'), e=True, v=False)
         
         label = self.get_color_button_label()
         if not label == "Set the Color":
@@ -709,157 +1188,353 @@ class ElementUI():
                     value=1
                     )
 
-    def create_icon_button(self, icon_name, func):
-        icon_dir_path = icon.get_icon_path()
-        path_list = ['controller', '{}.png'.format(icon_name)]
-        icon_path = os.path.join(icon_dir_path, *path_list)
-
-        builder = ControlBuilder()
-        command = lambda *args: (builder.build_controller('controller.{}'.format(func)))
-        btn = pm.nodeIconButton(style='iconOnly',
-                                c=command,
-                                image1=icon_path)
-        return btn
-
 
 class ControlBuilder():
 
     def __init__(self):
         self.element = ElementUI()
         self.default = DefalutValue()
+        self.registry = ShapeRegistry()
+        self.shapes = self.registry.cache
     
-    def build_controller(self, ctrl_name):
+    def build_controller(self, shape_id):
+        settings = BuildSettings.from_ui(self.element)
         selection = self.element.get_selections()
-        method = self.element.get_method_type()
+        return self.build(shape_id, selection, settings)
 
+    def build(self, shape_id, selection, settings):
         if not pm.objExists(self.default.controlGrp):
             pm.createNode('transform', n=self.default.controlGrp)
 
-        if method == 1:
-            self.create_ctrl(ctrl_name, selection)
-        elif method == 2:
-            self.replace_ctrl(ctrl_name, selection)
+        if settings.method == settings.CREATE:
+            return self.create_ctrl(shape_id, selection, settings)
+        elif settings.method == settings.REPLACE:
+            return self.replace_ctrl(shape_id, selection, settings)
+
+    def create_ctrl(self, shape_id, selection, settings=None):
+        """Create controllers for every selected node in one pass.
+
+        The whole build is a single undo step, the color settings are read
+        once for the batch and every zero group is moved under the control
+        group with one parent call.
+        """
+        if settings is None:
+            settings = BuildSettings.from_ui(self.element)
+        allocator = self.element.get_name_allocator()
 
-    def create_ctrl(self, ctrl_name, selection):
         ctrls = []
+        spaces = []
+        definition = self.registry.get_definition(shape_id)
 
-        # if selected, it makes ctrl on position selected
-        if selection:
+        with undo_chunk():
+            # if selected, it makes ctrl on position selected
             for i in selection:
                 # create and rename ctrl
-                ctrl = eval(ctrl_name + '()')
-                name = self.element.get_name(i)[0]
-                ctrls.append(name)
-                name = pm.rename(ctrl, name)
-
-                # set color
-                self.apply_color_value(target=name)
+                ctrl = self.shapes.create(definition)
+                # name from the short name, the long name is only for placing
+                short_name = str(i).rpartition('|')[2]
+                name = self.element.get_name(short_name, settings.naming,
+                                             allocator)[0]
+                ctrl = pm.rename(ctrl, name)
+                ctrls.append(ctrl)
 
                 # zero out and place to target
                 space = rigging.create_init_space(id_name=self.default.zero,
-                                                  nodes=name,
+                                                  nodes=ctrl,
                                                   idlwr=False)
                 position.snap_to_target(space, i)
-                pm.parent(space, self.default.controlGrp)
+                spaces.append(space)
 
-        # if no selected, it makes ctrl on world axis
-        else:
-            ctrl = eval(ctrl_name + '()')
-            ctrl = pm.rename(ctrl, 'control_CON')
-            ctrls.append(str(ctrl))
-            space = rigging.create_init_space(nodes=ctrl)
-            pm.parent(space, self.default.controlGrp)
+            # set color
+            if ctrls:
+                self.set_override_colors(self.get_color_targets(ctrls, settings),
+                                         settings)
+
+            # if no selected, it makes ctrl on world axis
+            else:
+                ctrl = self.shapes.create(definition)
+                ctrl = pm.rename(ctrl, 'control_{}'.format(self.default.con))
+                ctrls.append(ctrl)
+                spaces.append(rigging.create_init_space(nodes=ctrl))
+
+            pm.parent(spaces, self.default.controlGrp)
 
         # select curve generated
+        ctrls = [str(ctrl) for ctrl in ctrls]
         pm.select(ctrls, r=True)
         return ctrls
 
-    def replace_ctrl(self, ctrl_name, selection):
-        if not selection:
-            return
+    def replace_ctrl(self, shape_id, selection, settings=None):
+        """Swap the curve shapes of every selected node for a shape of the
+        library in one undo step.
 
+        Existing curve shapes are overwritten in place, only their CVs
+        being set when degree, form, CV count and knots match. A temporary curve
+        is only built for the curves the node has no shape for, and the
+        shapes left over are deleted together.
+        """
         ctrls = []
-        for sel in selection:
-            selection_shp = pm.listRelatives(sel, s=True)
-            for shp in selection_shp:
-                if pm.objectType(shp) == 'nurbsCurve':
-                    pm.parent(shp, s=True, rm=True)
-
-            ctrl = str(eval('{}()'.format(ctrl_name)))
-            ctrl_shape = pm.listRelatives(ctrl, s=True)
-            rename_ctrl_shape = pm.rename(ctrl_shape, '{}Shape#'.format(sel))
-
-            pm.parent(rename_ctrl_shape, sel, s=True, r=True)
-            pm.delete(ctrl)
-            ctrls.append(sel)
-        pm.select(ctrls)
-
-    def apply_color_value(self, target=None):
-        color_type = self.element.get_color_at()
-        color_value = self.element.get_color_value()
-        color_label = self.element.get_color_button_label()
-
-        pre_target = []
+        definition = self.registry.get_definition(shape_id)
+        with undo_chunk():
+            for sel in selection:
+                sel = str(sel)
+                existing = cmds.listRelatives(sel, s=True, type='nurbsCurve',
+                                              noIntermediate=True,
+                                              fullPath=True) or []
+                for curve, shp in zip(definition, existing):
+                    self.write_curve(shp, curve)
+                for curve in definition[len(existing):]:
+                    self.add_curve(sel, curve)
+                if len(existing) > len(definition):
+                    cmds.delete(existing[len(definition):])
+                ctrls.append(sel)
+            if ctrls:
+                cmds.select(ctrls)
+        return ctrls
+
+    def write_curve(self, shape, curve):
+        """Overwrite the data of a nurbsCurve shape with a curve definition.
+
+        Only the CVs are set when the shape already has the degree, form
+        and knots of the definition, otherwise the curve is replaced.
+        """
+        count = len(curve["cvs"])
+        if (cmds.getAttr(shape + '.degree') == curve["degree"] and
+                cmds.getAttr(shape + '.form') == curve["form"] and
+                cmds.getAttr(shape + '.controlPoints', size=True) == count and
+                curvedata.same_knots(pm.PyNode(shape).getKnots(), curve["knots"])):
+            values = [v for cv in curve["cvs"] for v in cv]
+            cmds.setAttr('{}.controlPoints[0:{}]'.format(shape, count - 1),
+                         *values, type='double3')
+        else:
+            cmds.curve(shape,
+                       replace=True,
+                       d=curve["degree"],
+                       p=curve["cvs"],
+                       k=curve["knots"],
+                       per=curvedata.is_periodic(curve))
+
+    def add_curve(self, node, curve):
+        """Add a nurbsCurve shape built from a curve definition under node.
+        """
+        temp = cmds.curve(d=curve["degree"],
+                          p=curve["cvs"],
+                          k=curve["knots"],
+                          per=curvedata.is_periodic(curve))
+        shape = cmds.listRelatives(temp, s=True, fullPath=True)[0]
+        shape = cmds.rename(shape, '{}Shape#'.format(node.rpartition('|')[2]))
+        shape = cmds.parent(shape, node, s=True, r=True)[0]
+        cmds.delete(temp)
+        return shape
+
+    def apply_color_value(self, target=None, settings=None):
+        """Set the override color of the target nodes, the selection by
+        default, as a single undo step.
+
+        The settings are read once for the whole batch.
+
+        Returns:
+            list: names of the transforms or shapes colored
+        """
+        if settings is None:
+            settings = BuildSettings.from_ui(self.element)
+        targets = self.get_color_targets(target, settings)
+
+        with undo_chunk():
+            self.set_override_colors(targets, settings)
+        return targets
+
+    def get_color_targets(self, target, settings):
+        """Return the names of the nodes a color is set on, listing the
+        shapes of every transform with one query in shape mode.
+        """
+        if settings.color_at is None:
+            return []
+        if settings.override and not settings.has_color():
+            return []
+
         if not target:
-            trg = [i for i in pm.selected(l=True)]
-            pre_target.extend(trg)
+            targets = cmds.ls(sl=True, l=True)
+        elif isinstance(target, (list, tuple)):
+            targets = [str(i) for i in target]
         else:
-            pre_target.append(target)
-        
-        for i in pre_target:
-            post_targets = None
-            if color_type == 1:
-                post_targets = [i]
-            if color_type == 2:
-                post_targets = i.getShapes()
-            
-            for trg in post_targets:
-                if color_label == "Set the Color":
-                    pm.setAttr('{}.overrideEnabled'.format(trg), 1)
-                    pm.setAttr('{}.overrideColor'.format(trg), color_value)
+            targets = [str(target)]
+
+        if targets and settings.color_at == settings.SHAPE:
+            targets = cmds.listRelatives(targets, shapes=True, fullPath=True) or []
+        return targets
+
+    def auto_color_controls(self, root=None, scheme='default', by='auto',
+                            color_at=BuildSettings.TRANSFORM, tolerance=0.001):
+        """Color every control under root by its side in a single undo step.
+
+        Sides are read from the name tokens of the naming rules, and from
+        the world X position of the controls when by is 'position' or when
+        the name tells nothing in 'auto' mode. The character left is +X.
+        The positions of those controls are queried with a single xform.
+        """
+        root = root or self.default.controlGrp
+        if not cmds.objExists(root):
+            pm.warning("{} does not exist".format(root))
+            return {}
+
+        shapes = cmds.listRelatives(root, allDescendents=True,
+                                    type='nurbsCurve', fullPath=True) or []
+        controls = sorted(set(cmds.listRelatives(shapes, parent=True,
+                                                 fullPath=True) or []))
+
+        sides = [None] * len(controls)
+        if by in ('name', 'auto'):
+            names = [control.rpartition('|')[2] for control in controls]
+            sides = DefalutValue.rules.classify(names)
+        unknown = [i for i, side in enumerate(sides) if side is None]
+        if by in ('position', 'auto') and unknown:
+            # xform returns the pivots of every node as one flat list
+            pivots = cmds.xform([controls[i] for i in unknown],
+                                q=True, ws=True, rp=True)
+            for index, x in zip(unknown, pivots[0::3]):
+                if abs(x) <= tolerance:
+                    sides[index] = 'center'
                 else:
-                    pm.setAttr('{}.overrideEnabled'.format(trg), 0)
+                    sides[index] = 'left' if x > 0 else 'right'
+
+        colors = scheme if isinstance(scheme, dict) else palette.get_scheme(scheme)
+        groups = OrderedDict()
+        for control, side in zip(controls, sides):
+            if side in colors:
+                groups.setdefault(side, []).append(control)
+
+        with undo_chunk():
+            for side, targets in groups.items():
+                settings = BuildSettings(color=colors[side], color_at=color_at)
+                self.set_override_colors(self.get_color_targets(targets, settings),
+                                         settings)
+        return groups
+
+    def set_override_colors(self, targets, settings):
+        """Set the override color of targets, writing only the attributes
+        whose value changes.
+
+        The values are set with setAttr rather than an MDGModifier so that
+        they stay in the undo chunk of the caller.
+        """
+        enabled = 1 if settings.override else 0
+        use_rgb = settings.rgb is not None
+        for trg in targets:
+            if cmds.getAttr(trg + '.overrideEnabled') != enabled:
+                cmds.setAttr(trg + '.overrideEnabled', enabled)
+            if not enabled:
+                continue
+
+            if cmds.getAttr(trg + '.overrideRGBColors') != use_rgb:
+                cmds.setAttr(trg + '.overrideRGBColors', use_rgb)
+            if use_rgb:
+                current = cmds.getAttr(trg + '.overrideColorRGB')[0]
+                if any(abs(a - b) > 1e-6 for a, b in zip(current, settings.rgb)):
+                    cmds.setAttr(trg + '.overrideColorRGB', *settings.rgb)
+            elif cmds.getAttr(trg + '.overrideColor') != settings.color:
+                cmds.setAttr(trg + '.overrideColor', settings.color)
 
 
 class EditControlShape():
+    """Rotate and scale controller shapes by moving their CVs.
+
+    Every CV of the curve shapes of a control is read with one query,
+    transformed as one array about the object center or pivot and written
+    back with one setAttr per shape, the whole edit being one undo step.
+    """
+
+    OBJECT_CENTER = 'objectCenter'
+    OBJECT_PIVOT = 'objectPivot'
+    ROTATE_STEP = 90.0
+    SCALE_STEP = 1.1
 
     def __init__(self):
         self.element = ElementUI()
 
-    def rotate_ctrl_shape(self, axis):
-        sel = pm.ls(sl=True)
-
+    def get_pivot_type(self):
         axis_type = self.element.get_axis_type()
-        axis_name = []
-        if axis_type == 1:
-            axis_name.append('objectCenter')
-        elif axis_type == 2:
-            axis_name.append('objectPivot')
-        controller.rotate_ctrl_shape(sel, axis, axis_name[0])
+        if axis_type == 2:
+            return self.OBJECT_PIVOT
+        return self.OBJECT_CENTER
+
+    def rotate_ctrl_shape(self, axis):
+        sel = cmds.ls(sl=True, l=True)
+        matrix = cvmath.rotate_matrix(axis, self.ROTATE_STEP)
+        self.transform_shapes(sel, matrix, self.get_pivot_type())
 
     def scale_ctrl_shape(self, axis):
-        sel = pm.ls(sl=True)
+        sel = cmds.ls(sl=True, l=True)
+        if axis == 'up':
+            matrix = cvmath.scale_matrix(self.SCALE_STEP)
+        else:
+            matrix = cvmath.scale_matrix(1.0 / self.SCALE_STEP)
+        self.transform_shapes(sel, matrix, self.get_pivot_type())
 
-        axis_type = self.element.get_axis_type()
-        axis_name = []
-        if axis_type == 1:
-            axis_name.append('objectCenter')
-        elif axis_type == 2:
-            axis_name.append('objectPivot')
-        controller.scale_ctrl_shape(sel, axis, axis_name[0])
+    def apply_numeric_transform(self):
+        """Scale and rotate the selected shapes by the values of the Rotate
+        and Scale fields.
+        """
+        sel = cmds.ls(sl=True, l=True)
+        matrix = cvmath.compose(scale=self.element.get_scale_values(),
+                                rotate=self.element.get_rotate_values())
+        self.transform_shapes(sel, matrix, self.get_pivot_type())
+
+    def get_curve_shapes(self, nodes):
+        """Return transform -> nurbsCurve shapes of nodes, in order.
+        """
+        shapes = OrderedDict()
+        for node in nodes:
+            curves = cmds.listRelatives(node, shapes=True, type='nurbsCurve',
+                                        noIntermediate=True, fullPath=True)
+            if curves:
+                shapes[node] = curves
+        return shapes
+
+    def transform_shapes(self, nodes, matrix, pivot=OBJECT_CENTER):
+        """Multiply the object space CVs of the curve shapes of nodes by a
+        4x4 matrix applied about the object center or pivot.
+
+        Returns:
+            list: curve shapes edited
+        """
+        edited = []
+        with undo_chunk():
+            for node, curves in self.get_curve_shapes(nodes).items():
+                points = []
+                counts = []
+                for curve in curves:
+                    cvs = cmds.getAttr('{}.controlPoints[*]'.format(curve))
+                    points.extend(cvs)
+                    counts.append(len(cvs))
+
+                if pivot == self.OBJECT_PIVOT:
+                    center = cmds.xform(node, q=True, os=True, rp=True)
+                else:
+                    center = cvmath.bounding_center(points)
+                points = cvmath.transform_points(points,
+                                                 cvmath.pivot_matrix(matrix, center))
+
+                start = 0
+                for curve, count in zip(curves, counts):
+                    values = [v for p in points[start:start + count] for v in p]
+                    cmds.setAttr('{}.controlPoints[0:{}]'.format(curve, count - 1),
+                                 *values, type='double3')
+                    start += count
+                    edited.append(curve)
+        return edited
 
     def select_shape_mode(self):
-        if not pm.filterExpand(sm=9):
+        """Select every CV of the selected curves as one cv[*] range per
+        shape, without building a component object per CV.
+        """
+        if not cmds.filterExpand(sm=9):
             return
 
-        sel = pm.ls(sl=True, l=True)
+        sel = cmds.ls(sl=True, l=True)
         if sel:
-            cur_shape = pm.listRelatives(sel, s=True)
-            cvs = []
-            for i in cur_shape:
-                cv = pm.ls(i + '.cv[*]')
-                cvs.extend(cv)
-            pm.select(cvs)
+            cur_shape = cmds.listRelatives(sel, s=True, fullPath=True) or []
+            cmds.select(['{}.cv[*]'.format(i) for i in cur_shape], r=True)
         else:
             return None
 
@@ -877,7 +1552,8 @@ class EditControlShape():
 class RegisterFunction():
     
     def __init__(self):
-        self.filePath = []
+        # shape name -> icon captured or drawn for it
+        self.iconPaths = {}
     
     def getNoImageIconPath(self):
         dir_path = os.path.dirname(os.path.abspath(__file__))
@@ -908,8 +1584,123 @@ class RegisterFunction():
                               e=True,
                               insertText=filename[0])
     
-    def export(self):
-        pass
+    def getExportDirectory(self):
+        """Return the custom export path when enabled, data/shapes of the
+        package otherwise.
+        """
+        if pm.checkBoxGrp("customExportCB", q=True, v1=True) and self.getFilePath():
+            return self.getFilePath()
+        dirName = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(dirName, "data", "shapes")
+
+    def getIconExportDirectory(self):
+        """Return the custom export path when enabled, the directory of the
+        selected tab under the icon root otherwise, which is where the
+        relative icon path of registerCurve points to.
+        """
+        if pm.checkBoxGrp("customExportCB", q=True, v1=True) and self.getFilePath():
+            return self.getFilePath()
+        return os.path.join(IconLayoutIO().getIconRootPath(),
+                            self.getTabType().lower())
+
+    def export(self, name=None, definition=None, fileType=None):
+        """Write the shape of the selected curve to the export directory in
+        the file type of the Options frame.
+
+        Args:
+            name (string): shape name, the Shape Name field by default
+            definition (list): curve definitions, captured from the
+                selected curve by default
+            fileType (string): 'binary', 'json' or 'mayaAscii'
+
+        Returns:
+            string: path of the exported file
+        """
+        name = name or self.getShapeName()
+        if not name:
+            pm.warning("Please enter a shape name")
+            return
+        if os.path.basename(name) != name or name in (".", ".."):
+            pm.warning("Shape name {} is not a valid file name".format(name))
+            return
+
+        fileType = fileType or self.getFileType()
+        dirPath = self.getExportDirectory()
+        if not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+
+        if fileType == "mayaAscii":
+            curve = pm.selected(type="transform")
+            if not curve:
+                pm.warning("Please select a nurbsCurve")
+                return
+            filePath = os.path.join(dirPath, "{}.ma".format(name))
+            tempPath = os.path.join(dirPath, ".{}.tmp.ma".format(name))
+            pm.select(curve[0])
+            with fileutil.lock(filePath):
+                pm.exportSelected(tempPath, type="mayaAscii", force=True)
+                fileutil.replace(tempPath, filePath)
+        else:
+            if definition is None:
+                curve = pm.selected(type="transform")
+                if not curve:
+                    pm.warning("Please select a nurbsCurve")
+                    return
+                definition = ShapeCache().capture(curve[0])
+            if fileType == "json":
+                filePath = os.path.join(dirPath, name + curvedata.JSON_EXT)
+                with fileutil.lock(filePath):
+                    curvedata.dump({name: definition}, filePath)
+            else:
+                filePath = os.path.join(dirPath, name + curvedata.BINARY_EXT)
+                with fileutil.lock(filePath):
+                    curvedata.dump_binary({name: definition}, filePath)
+
+        pm.displayInfo("Export Path: {}".format(filePath))
+        return filePath
+
+    def registerCurve(self):
+        """Add the selected curve to the shape table under the shape name
+        and write it to the shape library store, in the next free slot of
+        the selected tab.
+        """
+        curve = pm.selected(type="transform")
+        if not curve:
+            pm.warning("Please select a nurbsCurve")
+            return
+
+        name = self.getShapeName()
+        if not name:
+            pm.warning("Please enter a shape name")
+            return
+
+        definition = ShapeCache().capture(curve[0])
+        ShapeRegistry.register(name, definition)
+
+        tab = self.getTabType()
+        if name in self.iconPaths:
+            icon = layout.relative_icon_path(self.iconPaths[name])
+        else:
+            icon = "{}/{}.png".format(tab.lower(), name)
+
+        iconLayout = IconLayoutIO()
+        store = iconLayout.getStore()
+        try:
+            previous = store.entries().get(name)
+            if previous and previous["tab"] == tab:
+                store.put(name, definition, tab=tab, icon=icon)
+            else:
+                tabIndex, layoutIndex = layout.next_slot(iconLayout.getIndex(), tab)
+                store.put(name, definition, tab=tab, tabIndex=tabIndex,
+                          layoutIndex=layoutIndex, icon=icon)
+        except (IOError, OSError, ValueError) as e:
+            print(e)
+            pm.warning("Could not write {} to {}".format(name, store.path))
+            return definition
+
+        self.iconPaths.pop(name, None)
+        pm.displayInfo("Registered Shape: {}".format(name))
+        return definition
     
     def convertCurveToStroke(self, *args):
         """Export selection, prompt for name, and create icon as well.
@@ -922,6 +1713,14 @@ class RegisterFunction():
             return
         
         # create the icon
+        self.setupBrush()
+
+        pm.select(curve)
+        pm.runtime.AttachBrushToCurves(curve)
+
+    def setupBrush(self):
+        """Set the template brush the icon strokes are drawn with.
+        """
         pm.runtime.ResetTemplateBrush()
         brush = pm.getDefaultBrush()
         pm.setAttr('{}.brushWidth'.format(brush), 0.06)
@@ -929,10 +1728,15 @@ class RegisterFunction():
         pm.setAttr('{}.screenspaceWidth'.format(brush), 1)
         pm.setAttr('{}.distanceScaling'.format(brush), 0.01)
         pm.setAttr('{}.color1'.format(brush), 0.35, 0.85, 0.60, type='double3')
+        return brush
+
+    def setupRenderGlobals(self, image_name):
+        png_format = 32
+        pm.setAttr('defaultRenderGlobals.currentRenderer', 'mayaSoftware', type='string')
+        pm.setAttr('defaultRenderGlobals.imageFormat', png_format)
+        pm.setAttr('defaultRenderGlobals.imfkey', 'xpm', type='string')
+        pm.setAttr('defaultRenderGlobals.imageFilePrefix', image_name, type='string')
 
-        pm.select(curve)
-        pm.runtime.AttachBrushToCurves(curve)
-        
     def deleteAllStrokes(self):
         strokes = [x for x in pm.ls(type='stroke')]
         for each in strokes:
@@ -943,24 +1747,27 @@ class RegisterFunction():
         """
         image_name = self.getShapeName()
         cam = self.getCurrentCamera()
-
-        png_format = 32
-        pm.setAttr('defaultRenderGlobals.currentRenderer', 'mayaSoftware', type='string')
-        pm.setAttr('defaultRenderGlobals.imageFormat', png_format)
-        pm.setAttr('defaultRenderGlobals.imfkey', 'xpm', type='string')
-        pm.setAttr('defaultRenderGlobals.imageFilePrefix', image_name, type='string')
+        self.setupRenderGlobals(image_name)
 
         pm.setAttr('{}.backgroundColor'.format(cam), 0.8, 0.8, 0.8, type='double3')
         image = pm.render(cam, xresolution=width, yresolution=height)
         base = os.path.basename(image)
-        filePath = os.path.join(self.getFilePath(), base)
+        dirPath = self.getIconExportDirectory()
+        if not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+        filePath = os.path.join(dirPath, base)
         
         # here we attempt to move the rendered icon to a more generalized icon location
         if filePath:
-            self.filePath.append(filePath)
-            shutil.move(image, filePath)
+            self.iconPaths[image_name] = filePath
+            fileutil.atomic_move(image, filePath)
             pm.displayInfo("Export Path: {}".format(filePath))
 
+            iconLayout = IconLayoutIO()
+            iconRoot = os.path.abspath(iconLayout.getIconRootPath())
+            if os.path.abspath(filePath).startswith(iconRoot + os.sep):
+                iconLayout.updateAtlas()
+
         pm.iconTextButton('iconTB',
                           e=True,
                           style='iconOnly',
@@ -973,6 +1780,43 @@ class RegisterFunction():
 
         return filePath
     
+    def drawNewImage(self, width=32, height=32, view="iso"):
+        """Draw the icon of the selected curve from its CVs, without
+        rendering, into the custom export path or the icon directory of the
+        selected tab.
+        """
+        curve = pm.selected(type="transform")
+        if not curve:
+            pm.warning("Please select a nurbsCurve")
+            return
+
+        image_name = self.getShapeName()
+        if not image_name:
+            pm.warning("Please enter a shape name")
+            return
+
+        definition = ShapeCache().capture(curve[0])
+        dirPath = self.getIconExportDirectory()
+        if not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+        filePath = os.path.join(dirPath, "{}.png".format(image_name))
+        with fileutil.atomic_write(filePath, "wb") as f:
+            f.write(pngio.encode(width, height,
+                                 raster.render(definition, width, height, view)))
+        self.iconPaths[image_name] = filePath
+        pm.displayInfo("Export Path: {}".format(filePath))
+
+        iconLayout = IconLayoutIO()
+        iconRoot = os.path.abspath(iconLayout.getIconRootPath())
+        if os.path.abspath(filePath).startswith(iconRoot + os.sep):
+            iconLayout.updateAtlas()
+
+        pm.iconTextButton('iconTB',
+                          e=True,
+                          style='iconOnly',
+                          image=filePath)
+        return filePath
+
     def getCurrentCamera(self):
         """
         Returns the camera that you're currently looking through.
@@ -1037,13 +1881,106 @@ class RegisterFunction():
         return fileType
     
     
+class IconRenderer():
+    """Render controller icons without the window.
+
+    The camera, render settings and brush are set up once and shared by
+    every shape, each shape being built, framed, rendered and deleted in
+    turn.
+    """
+
+    CAMERA_NAME = 'iconRender_CAM'
+    CAMERA_ROTATE = [-35.0, 45.0, 0.0]
+    BACKGROUND = [0.8, 0.8, 0.8]
+
+    def __init__(self, width=32, height=32):
+        self.width = width
+        self.height = height
+        self.func = RegisterFunction()
+        self.camera = None
+
+    def setup(self):
+        self.camera = cmds.camera(name=self.CAMERA_NAME, orthographic=True)[0]
+        cmds.setAttr(self.camera + '.rotate', *self.CAMERA_ROTATE)
+        cmds.setAttr(self.camera + '.backgroundColor', *self.BACKGROUND)
+        self.func.setupRenderGlobals(self.CAMERA_NAME)
+        self.func.setupBrush()
+
+    def teardown(self):
+        if self.camera and cmds.objExists(self.camera):
+            cmds.delete(self.camera)
+        self.camera = None
+
+    def render(self, jobs):
+        """Render [shape ID, icon path] jobs.
+
+        Returns:
+            tuple: paths of the icons written and IDs of the unknown shapes
+                and of the shapes that failed to render
+        """
+        registry = ShapeRegistry()
+        registry.register_store()
+        written = []
+        failed = []
+        self.setup()
+        try:
+            for shape_id, iconPath in jobs:
+                try:
+                    definition = registry.get_definition(shape_id)
+                except KeyError:
+                    pm.warning("Unknown shape: {}".format(shape_id))
+                    failed.append(shape_id)
+                    continue
+                try:
+                    written.append(self.render_shape(registry, definition,
+                                                     shape_id, iconPath))
+                except Exception as e:
+                    print(e)
+                    pm.warning("Could not render {}".format(shape_id))
+                    failed.append(shape_id)
+        finally:
+            self.teardown()
+        return written, failed
+
+    def render_shape(self, registry, definition, shape_id, iconPath):
+        ctrl = registry.cache.create(definition)
+        strokes = set(cmds.ls(type='stroke', long=True))
+        try:
+            pm.select(ctrl)
+            pm.runtime.AttachBrushToCurves(ctrl)
+            pm.select(ctrl)
+            cmds.viewFit(self.camera, fitFactor=0.9)
+            cmds.setAttr('defaultRenderGlobals.imageFilePrefix', shape_id, type='string')
+            image = cmds.render(self.camera, x=self.width, y=self.height)
+        finally:
+            # only the strokes of this shape, the scene may have its own
+            created = set(cmds.ls(type='stroke', long=True)) - strokes
+            if created:
+                cmds.delete(cmds.listRelatives(list(created), parent=True,
+                                               fullPath=True))
+            if pm.objExists(ctrl):
+                pm.delete(ctrl)
+
+        dirName = os.path.dirname(iconPath)
+        if not os.path.isdir(dirName):
+            os.makedirs(dirName)
+        fileutil.atomic_move(image, iconPath)
+        return iconPath
+
+
 class IconLayoutIO():
     
     FILE_NAME = "iconLayout.json"
-    
+    CACHE_NAME = "iconLayout.cache.json"
+    indexCache = {}
+    iconCache = {}
+
     def __init__(self):
         self.filePath = self.getLayoutDataPath()
-        self.data = self.getLayoutData()
+        self.cachePath = self.getLayoutCachePath()
+        self.data = None
+        self.builder = None
+        self.pendingTabs = {}
         
     def __importData(self):
         """Return the contents of a json file. Expecting, but not limited to,
@@ -1068,8 +2005,9 @@ class IconLayoutIO():
             filePath (string): path to output json file
         """
         try:
-            with open(self.filePath, "w") as json_file:
-                json.dump(data, json_file, sort_keys=True, indent=4)
+            with fileutil.lock(self.filePath):
+                with fileutil.atomic_write(self.filePath) as json_file:
+                    json.dump(data, json_file, sort_keys=True, indent=4)
 
             msg = "icon layout data exported: {}"
             pm.displayInfo(msg.format(self.filePath))
@@ -1080,6 +2018,154 @@ class IconLayoutIO():
     def getLayoutDataPath(self):
         dirName = os.path.dirname(__file__)
         return os.path.join(dirName, "data", self.FILE_NAME)
+
+    def getLayoutCachePath(self):
+        return os.path.join(get_user_dir(), self.CACHE_NAME)
+
+    def getIconRootPath(self):
+        dirName = os.path.dirname(__file__)
+        return os.path.join(dirName, "icon", "controller")
+
+    def getAtlasPath(self):
+        dirName = os.path.dirname(__file__)
+        return os.path.join(dirName, "icon", "atlas.png")
+
+    def getIconCachePath(self):
+        return os.path.join(get_user_dir(), "icons")
+
+    def getIconIndex(self):
+        """Return relative icon path -> resolved path for every icon of the
+        library, once per session.
+
+        When the library ships an icon atlas it is read as a single file
+        and split into a local cache, otherwise the icon directory is
+        scanned.
+        """
+        rootPath = self.getIconRootPath()
+        if rootPath in self.iconCache:
+            return self.iconCache[rootPath]
+
+        icons = None
+        atlasPath = self.getAtlasPath()
+        if os.path.exists(atlasPath):
+            try:
+                icons = atlas.extract(atlasPath, self.getIconCachePath())
+            except Exception as e:
+                print(e)
+        if icons is None:
+            icons = layout.scan_icons(rootPath)
+
+        self.iconCache[rootPath] = icons
+        return icons
+
+    def getStore(self):
+        return shapestore.ShapeStore()
+
+    def getIconPath(self, path):
+        icons = self.getIconIndex()
+        if path in icons:
+            return icons[path]
+        return self.findIconFile(path) or RegisterFunction().getNoImageIconPath()
+
+    def findIconFile(self, path):
+        """Return the file of an icon missing from the icon index, or None.
+        """
+        # icons of the shape store living outside of the library
+        if os.path.isabs(path) and os.path.exists(path):
+            return path
+
+        # icons added after the atlas was last packed
+        iconPath = os.path.join(self.getIconRootPath(), *path.split('/'))
+        if os.path.exists(iconPath):
+            return iconPath
+        return None
+
+    def getMissingIcons(self, index):
+        """Return the icon paths of index that are neither in the icon
+        index nor on disk, only the icons missing from the index being
+        looked up one by one.
+        """
+        return set(path for path in layout.missing_icons(index, self.getIconIndex())
+                   if self.findIconFile(path) is None)
+
+    def updateAtlas(self, rebuild=False):
+        """Pack the new and changed icons of the library into the atlas.
+        """
+        updated = atlas.pack(self.getIconRootPath(),
+                             self.getAtlasPath(),
+                             rebuild=rebuild)
+        self.iconCache.pop(self.getIconRootPath(), None)
+        pm.displayInfo("icon atlas updated: {} icons".format(len(updated)))
+        return updated
+
+    def getIconJobs(self, force=False):
+        """Return [shape ID, icon path] of every icon of the library that
+        is missing or older than its shape in the store.
+        """
+        store = self.getStore()
+        times = store.modified_times() if store.exists() else {}
+        return layout.icon_jobs(self.getIndex(), self.getIconRootPath(),
+                                times, force)
+
+    def renderIcons(self, force=False):
+        """Render the missing and stale icons in this session and pack them
+        into the atlas.
+        """
+        written, failed = render_icons(self.getIconJobs(force=force))
+        self.iconCache.pop(self.getIconRootPath(), None)
+        if os.path.exists(self.getAtlasPath()):
+            self.updateAtlas()
+        pm.displayInfo("rendered icons: {}, failed: {}".format(len(written),
+                                                              len(failed)))
+        return written
+
+    def findMissingIcons(self):
+        missing = self.getMissingIcons(self.getIndex())
+        for path in sorted(missing):
+            pm.warning("Icon not found: {}".format(path))
+        return missing
+
+    def getIndex(self):
+        """Return the tab -> sub-tab -> slot index of the layout file and
+        the shape library store.
+
+        The index is kept for the session and read from the pre-sorted
+        cache file while the layout file and the store are unchanged, so
+        the layout is only parsed and sorted again after either has been
+        edited. Shapes of the store are read from its header index.
+        """
+        store = self.getStore()
+        storeStamp = store.stamp()
+        stamp = [layout.stamp(self.filePath), storeStamp]
+        cached = self.indexCache.get(self.filePath)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        index = layout.load_index(self.cachePath, self.filePath, storeStamp)
+        if index is None:
+            if self.data is None:
+                self.data = self.getLayoutData()
+            data = self.data
+            if storeStamp is not None:
+                try:
+                    data = layout.add_entries(data, store.layout_entries())
+                except (IOError, OSError, ValueError) as e:
+                    print(e)
+            collisions = []
+            index = layout.build_index(data, collisions)
+            for tabName, tabIndex, layoutIndex, name in collisions:
+                msg = "Icon layout slot {} {}-{} is used twice, {} is placed after it"
+                pm.warning(msg.format(tabName, tabIndex, layoutIndex, name))
+            for path in sorted(self.getMissingIcons(index)):
+                pm.warning("Icon not found: {}".format(path))
+            try:
+                layout.save_index(index, self.cachePath, self.filePath,
+                                  storeStamp)
+            except Exception as e:
+                print(e)
+
+        self.indexCache[self.filePath] = (stamp, index)
+        return index
     
     def getLayoutData(self):
         if not self.filePath:
@@ -1092,123 +2178,97 @@ class IconLayoutIO():
         return data
         
     def sortLayoutOrderData(self):
+        """Return every layout entry as [tabName, numberOfTab, {name: data}]
+        ordered by tab, sub-tab and layout slot.
+        """
         items = []
-        for tabDict in self.sortTabOrderData():
-            pre_order = {}
-            for index, tittleData in tabDict.items():
-                for curveData in tittleData:
-                    for tabName, data in curveData.items():
-                        name = data[0]
-                        tabNum = data[1]
-                        layoutIndex = data[2]["layoutIndex"]
-                        pre_order[layoutIndex] = [tabName, tabNum, {name:data[2]}]
-            sortItems = sorted(pre_order.items(), key=lambda x: x[1])
-            items.extend(dict(sortItems).values())
+        for tabName, tabNum, subTabs in self.getIndex():
+            for tabIndex, slots in subTabs:
+                for name, path, layoutIndex in slots:
+                    data = {"path": path,
+                            "tabIndex": tabIndex,
+                            "layoutIndex": layoutIndex}
+                    items.append([tabName, tabNum, {name: data}])
         return items
-    
-    def sortTabOrderData(self):
-        allItems = []
-        for tabDict in self.sortTabMainOrderData():
-            pre_order = {}
-            for tittle, data in tabDict.items():
-                indexList = []
-                numTab = data["numberOfTab"]
-                for name, contentData in data["contents"].items():
-                    tabIndex = contentData["tabIndex"]
-                    # print tittle, name, contentData
-                    for i in range(1, data["numberOfTab"] + 1):
-                        if i == tabIndex:
-                            indexList.append({tittle:[name, numTab, contentData]})
-                pre_order[tabIndex] = indexList
-            allItems.append(pre_order)
-            # sortItems = sorted(pre_order.items(), key=lambda x: x[1])
-        return allItems
-    
+
     def collectLayoutInfo(self):
         pass
 
-    def sortTabMainOrderData(self):
-        indexDict = {}
-        for mainTab, tabInfo in self.data.items():
-            index = tabInfo["indexOrder"]
-            indexDict[index] = {mainTab:tabInfo}
-        sortItems = sorted(indexDict.items(), key=lambda x: x[1])
-        return dict(sortItems).values()
-    
-    def generateTab(self):
-        mainTab = pm.tabLayout("mainTab",
-                    innerMarginWidth=5,
-                    innerMarginHeight=5,
-                    parent='MakeMasterCL'
-                    )
-        
-        layoutDict, subTabLayout = {}, []
-        for tabName, tabNum, curveData in self.sortLayoutOrderData():
-            tabLayName = "tabLayout{}".format(tabName)
-            subTabName = "subTab{}".format(tabName)
-
-            for curveName, data in curveData.items():
-                path = data["path"]
-                tabIndex = data["tabIndex"]
-                layoutIndex = data["layoutIndex"]
-                if not pm.rowColumnLayout(tabLayName, ex=True):
-                    lay = pm.rowColumnLayout(
-                                tabLayName,
-                                w=250,
-                                h=127,
-                                nc=7,
-                                p=mainTab)
-                    if len(tabName) <= 10:
-                        centerTab = tabName.center(14)
-                    else:
-                        centerTab = tabName
-                    layoutDict[centerTab] = tabLayName
-                
-                if not pm.tabLayout(subTabName, ex=True):
-                    subTab = pm.tabLayout(subTabName,
-                                          innerMarginWidth=5,
-                                          innerMarginHeight=5,
-                                          p=lay
-                                          )
-                    subTabLayout.append(subTab)
-                    pm.setParent('..')
-                
-        for subTab in subTabLayout:
-            for i in range(1, 8):
-                subTabLayName = "subTabLayout{}{}".format(tabName, i)
-                subRowLayout = pm.rowColumnLayout(
-                                    subTabLayName,
-                                    w=242,
-                                    h=102,
-                                    nc=7,
-                                    p=subTab)
-                pm.setParent('..')
-                pm.tabLayout(subTab,
-                             e=True,
-                             tabLabel=(subRowLayout, str(i).center(2)))
-            pm.setParent('..')
-
-        # self.create_icon_button(curveName, subLayoutDict[tabIndex], path)
-
-        layout = []
-        for tabName, layName in layoutDict.items():
-            layout.append([layName, tabName])
-        
-        pm.tabLayout(mainTab,
-                     edit=True,
-                     tabLabel=((layout[0][0], layout[0][1]),
-                               (layout[1][0], layout[1][1]),
-                               (layout[2][0], layout[2][1])))
-        
-        return layout
-    
+    def generateTab(self, builder, parent='MakeMasterCL'):
+        """Create the icon tabs described by the layout file.
+
+        Tabs with several sub-tabs get a nested tab layout. The icon
+        buttons of a tab are created the first time the tab is shown.
+        """
+        self.builder = builder
+        self.pendingTabs = {}
+        try:
+            ShapeRegistry.register_store(self.getStore())
+        except (IOError, OSError, ValueError) as e:
+            print(e)
+
+        mainTab = pm.tabLayout(ui('iconTabLayout'),
+                               innerMarginWidth=5,
+                               innerMarginHeight=5,
+                               changeCommand=self.populateTab,
+                               parent=parent)
+
+        tabLabels = []
+        for index, (tabName, numTab, subTabs) in enumerate(self.getIndex()):
+            tabLayName = ui('tabLayout{}'.format(index))
+            if numTab > 1:
+                lay = pm.tabLayout(tabLayName,
+                                   innerMarginWidth=5,
+                                   innerMarginHeight=5,
+                                   parent=mainTab)
+                subLabels, pending = [], []
+                for tabIndex, slots in subTabs:
+                    subTabLayName = ui('subTabLayout{}{}'.format(index, tabIndex))
+                    subRowLayout = pm.rowColumnLayout(subTabLayName,
+                                                      w=242,
+                                                      nc=7,
+                                                      p=lay)
+                    subLabels.append((subRowLayout, str(tabIndex).center(2)))
+                    pending.append((subTabLayName, slots))
+                pm.tabLayout(lay, e=True, tabLabel=subLabels)
+                self.pendingTabs[tabLayName] = pending
+            else:
+                lay = pm.rowColumnLayout(tabLayName, w=250, nc=7, p=mainTab)
+                self.pendingTabs[tabLayName] = [
+                    (tabLayName, slots) for tabIndex, slots in subTabs]
+
+            if len(tabName) <= 10:
+                centerTab = tabName.center(14)
+            else:
+                centerTab = tabName
+            tabLabels.append((lay, centerTab))
+
+        pm.tabLayout(mainTab, edit=True, tabLabel=tabLabels)
+        self.populateTab()
+        return tabLabels
+
+    def populateTab(self, *args):
+        """Create the icon buttons of the selected tab if it is shown for
+        the first time.
+        """
+        tab = pm.tabLayout(ui('iconTabLayout'), q=True, selectTab=True)
+        pending = self.pendingTabs.pop(tab, [])
+        if not pending:
+            return
+
+        for parent, slots in pending:
+            for name, path, layoutIndex in slots:
+                self.create_icon_button(name, parent, self.getIconPath(path))
+
     def create_icon_button(self, name, parent, path):
+        builder = self.builder
         btn = pm.nodeIconButton(style='iconOnly',
                                 image1=path,
                                 annotation=name,
+                                c=lambda *args: (builder.build_controller(name)),
                                 parent=parent)
         return btn
-    
+
     def layoutIconTab(self, data):
         pass
     
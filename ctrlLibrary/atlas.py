@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Icon atlas.
+
+Packs every png of the icon library into a single atlas image plus an
+index of where each icon lives in it, so an install on network storage
+can be read with one file access instead of one per icon.
+
+    {"version": 1, "width": 512, "height": 64, "cursor": [x, y, rowHeight],
+     "icons": {"2d/circleNormal.png": [x, y, w, h, mtime, size], ...}}
+
+Packing is incremental: only icons that are new or changed since the
+last pack are read and written into the atlas.
+
+Usage:
+    python atlas.py [iconRoot] [atlasPath]
+
+================================================="""
+
+# Standard Modules
+import os
+import sys
+import json
+
+try:
+    from . import pngio
+    from . import layout
+    from . import fileutil
+except (ImportError, ValueError):
+    # run as a script outside of Maya
+    import pngio
+    import layout
+    import fileutil
+
+
+VERSION = 1
+ATLAS_WIDTH = 512
+STAMP_NAME = "atlas.stamp"
+
+
+def get_index_path(atlasPath):
+    return os.path.splitext(atlasPath)[0] + ".json"
+
+
+def load(atlasPath):
+    """Return (index, pixels) of an atlas, or (None, None) if there is no
+    usable atlas at atlasPath.
+    """
+    try:
+        with open(get_index_path(atlasPath), "r") as f:
+            index = json.load(f)
+        width, height, pixels = pngio.read(atlasPath)
+    except (IOError, OSError, ValueError):
+        return None, None
+
+    if index.get("version") != VERSION:
+        return None, None
+    if [width, height] != [index["width"], index["height"]]:
+        return None, None
+    return index, pixels
+
+
+def pack(rootPath, atlasPath, rebuild=False):
+    """Add the new and changed icons under rootPath to the atlas.
+
+    Args:
+        rootPath (string): icon directory, usually icon/controller
+        atlasPath (string): path of the atlas png
+        rebuild (bool): pack every icon again into a new atlas
+
+    Returns:
+        list: relative paths of the icons written into the atlas
+    """
+    with fileutil.lock(atlasPath):
+        return _pack(rootPath, atlasPath, rebuild)
+
+
+def _pack(rootPath, atlasPath, rebuild):
+    index, pixels = (None, None) if rebuild else load(atlasPath)
+    if index is None:
+        index = {"version": VERSION,
+                 "width": ATLAS_WIDTH,
+                 "height": 0,
+                 "cursor": [0, 0, 0],
+                 "icons": {}}
+        pixels = bytearray()
+
+    icons = layout.scan_icons(rootPath)
+    entries = index["icons"]
+    removed = set(entries) - set(icons)
+    for relPath in removed:
+        del entries[relPath]
+
+    updated = []
+    for relPath in sorted(icons):
+        stamp = layout.stamp(icons[relPath])
+        entry = entries.get(relPath)
+        if entry and entry[4:] == stamp:
+            continue
+
+        width, height, iconPixels = pngio.read(icons[relPath])
+        if entry and entry[2:4] == [width, height]:
+            x, y = entry[:2]
+        else:
+            x, y = _allocate(index, width, height)
+            pixels.extend(bytearray((index["height"] * index["width"] * 4) - len(pixels)))
+
+        _blit(iconPixels, width, height, pixels, index["width"], x, y)
+        entries[relPath] = [x, y, width, height] + stamp
+        updated.append(relPath)
+
+    if updated or removed or rebuild:
+        with fileutil.atomic_write(atlasPath, "wb") as f:
+            f.write(pngio.encode(index["width"], index["height"], pixels))
+        with fileutil.atomic_write(get_index_path(atlasPath)) as f:
+            json.dump(index, f, sort_keys=True, separators=(",", ":"))
+    return updated
+
+
+def extract(atlasPath, cacheDir):
+    """Return relative icon path -> local png path for every icon of the
+    atlas.
+
+    The atlas is read once and split into cacheDir, which is only written
+    again when the atlas has changed since the last extraction.
+    """
+    with open(get_index_path(atlasPath), "r") as f:
+        index = json.load(f)
+
+    paths = {}
+    for relPath in index["icons"]:
+        paths[relPath] = os.path.join(cacheDir, *relPath.split("/"))
+
+    stampPath = os.path.join(cacheDir, STAMP_NAME)
+    stamp = layout.stamp(atlasPath)
+    try:
+        with open(stampPath, "r") as f:
+            if json.load(f) == stamp:
+                return paths
+    except (IOError, OSError, ValueError):
+        pass
+
+    atlasWidth, atlasHeight, pixels = pngio.read(atlasPath)
+    for relPath, entry in index["icons"].items():
+        x, y, width, height = entry[:4]
+        iconPixels = bytearray()
+        for row in range(y, y + height):
+            start = (row * atlasWidth + x) * 4
+            iconPixels.extend(pixels[start:start + width * 4])
+
+        dirName = os.path.dirname(paths[relPath])
+        if not os.path.isdir(dirName):
+            os.makedirs(dirName)
+        pngio.write(paths[relPath], width, height, iconPixels)
+
+    with open(stampPath, "w") as f:
+        json.dump(stamp, f)
+    return paths
+
+
+def _allocate(index, width, height):
+    x, y, rowHeight = index["cursor"]
+    if x + width > index["width"]:
+        x, y, rowHeight = 0, y + rowHeight, 0
+    index["cursor"] = [x + width, y, max(rowHeight, height)]
+    index["height"] = max(index["height"], y + height)
+    return x, y
+
+
+def _blit(iconPixels, width, height, pixels, atlasWidth, x, y):
+    stride = width * 4
+    for row in range(height):
+        start = ((y + row) * atlasWidth + x) * 4
+        pixels[start:start + stride] = iconPixels[row * stride:(row + 1) * stride]
+
+
+if __name__ == "__main__":
+    dirName = os.path.dirname(os.path.abspath(__file__))
+    args = sys.argv[1:]
+    root = args[0] if args else os.path.join(dirName, "icon", "controller")
+    target = args[1] if len(args) > 1 else os.path.join(dirName, "icon", "atlas.png")
+    for path in pack(root, target):
+        print("packed: {}".format(path))
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Headless controller builds.
+
+Builds controllers from a json spec without opening the window, so rigs
+can be processed from mayapy on the farm or in CI.
+
+    {
+        "scene": "char.ma",
+        "output": "char_ctrl.ma",
+        "controls": [
+            {"nodes": ["hip_JNT"], "shape": "circleNormal",
+             "method": "create", "naming": "ReelFX",
+             "color": 17, "colorAt": "shape", "hierarchy": true},
+            {"nodes": ["arm_L_JNT"], "shape": "cube01", "rgb": [0.0, 0.4, 1.0]}
+        ]
+    }
+
+Many scene files are processed with a manifest, each scene in its own
+interpreter process, and the results are gathered into one report.
+
+    {
+        "controls": [...],
+        "jobs": [{"scene": "charA.ma", "output": "charA_ctrl.ma"},
+                 {"scene": "charB.ma", "output": "charB_ctrl.ma",
+                  "controls": [...]}]
+    }
+
+Icons of the library that are missing or older than their shape are
+rendered the same way, split across the workers and packed into the atlas
+once every worker is done.
+
+    {"icons": {"jobs": [["circleNormal", ".../icon/controller/2d/circleNormal.png"]]}}
+
+With --raster the icons are drawn from the curve data of the shape store
+and of the shape cache instead, in this process and without Maya.
+
+Usage:
+    mayapy batch.py spec.json [--scene char.ma] [--output char_ctrl.ma]
+    python batch.py --manifest manifest.json [--workers 8] [--report report.json]
+    python batch.py --icons [--force] [--workers 8] [--raster]
+
+================================================="""
+
+# Standard Modules
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import traceback
+import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+try:
+    from . import atlas
+    from . import pngio
+    from . import layout
+    from . import raster
+    from . import fileutil
+    from . import curvedata
+    from . import shapestore
+except (ImportError, ValueError):
+    # run as a script outside of Maya
+    import atlas
+    import pngio
+    import layout
+    import raster
+    import fileutil
+    import curvedata
+    import shapestore
+
+
+SPEC_KEYS = {"nodes": "nodes",
+             "shape": "shape",
+             "method": "method",
+             "naming": "naming",
+             "color": "color",
+             "colorAt": "color_at",
+             "override": "override",
+             "hierarchy": "hierarchy",
+             "nodeType": "node_type",
+             "depth": "depth",
+             "exclude": "exclude",
+             "rgb": "rgb"}
+
+
+def import_library():
+    """Return the controller library package, also when this file is run
+    as a script.
+    """
+    if __name__ != "__main__":
+        return importlib.import_module(__name__.rpartition(".")[0])
+    if __package__:
+        return importlib.import_module(__package__)
+
+    rootPath = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(rootPath))
+    return importlib.import_module(os.path.basename(rootPath))
+
+
+def load_spec(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def run_spec(spec):
+    """Open the scene of a spec, build its controllers and save the result.
+
+    Args:
+        spec (dict): scene, output and controls to build
+
+    Returns:
+        dict: scene, output, the controllers built for each entry, the icons
+            rendered and the shapes whose icon could not be rendered
+    """
+    import maya.standalone
+    maya.standalone.initialize(name="python")
+    import pymel.core as pm
+
+    library = import_library()
+    if spec.get("scene"):
+        pm.openFile(spec["scene"], force=True)
+
+    controls = []
+    for entry in spec.get("controls", []):
+        kwargs = dict((SPEC_KEYS[key], value) for key, value in entry.items()
+                      if key in SPEC_KEYS)
+        kwargs.setdefault("nodes", [])
+        controls.append(library.build_controls(**kwargs))
+
+    icons, missing = [], []
+    if spec.get("icons"):
+        icons, missing = library.render_icons(**spec["icons"])
+
+    if spec.get("output"):
+        pm.saveAs(spec["output"], force=True)
+    return {"scene": spec.get("scene"),
+            "output": spec.get("output"),
+            "controls": controls,
+            "icons": icons,
+            "missing": missing}
+
+
+def get_user_dir():
+    """Return the per-user cache directory of the library where Maya puts
+    it, read without Maya: MAYA_APP_DIR or the default maya directory.
+    """
+    appDir = os.environ.get("MAYA_APP_DIR")
+    if not appDir:
+        home = os.path.expanduser("~")
+        if sys.platform == "win32":
+            appDir = os.path.join(home, "Documents", "maya")
+        elif sys.platform == "darwin":
+            appDir = os.path.join(home, "Library", "Preferences", "Autodesk", "maya")
+        else:
+            appDir = os.path.join(home, "maya")
+    return os.path.join(appDir, "ctrlLibrary")
+
+
+def get_icon_jobs(force=False):
+    """Return [shape ID, icon path] of every icon of the library that is
+    missing or older than its shape, read without Maya.
+    """
+    rootPath = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(rootPath, "data", "iconLayout.json"), "r") as f:
+        data = json.load(f)
+
+    store = shapestore.ShapeStore()
+    times = {}
+    if store.exists():
+        data = layout.add_entries(data, store.layout_entries())
+        times = store.modified_times()
+    return layout.icon_jobs(layout.build_index(data),
+                            os.path.join(rootPath, "icon", "controller"),
+                            times, force)
+
+
+def get_icon_manifest(jobs, workers, size=32):
+    """Return a manifest splitting icon jobs evenly across workers.
+    """
+    workers = max(1, min(workers, len(jobs)))
+    return {"jobs": [{"icons": {"jobs": jobs[i::workers],
+                                "width": size,
+                                "height": size}}
+                     for i in range(workers) if jobs[i::workers]]}
+
+
+def draw_icons(jobs, size=32, view="iso"):
+    """Draw icons from the curve data of the shape cache and store, without
+    Maya.
+
+    Args:
+        jobs (list): [shape ID, icon path] to draw
+        size (int): width and height of the icons
+        view (string): view the curves are projected in, see raster.VIEWS
+
+    Returns:
+        dict: report of the icons drawn and the shapes without curve data
+            in missing, every one of them counting as failed
+    """
+    definitions = {}
+    # the controller module cannot be stamped without Maya, only the cache
+    # version is checked
+    cachePath = os.path.join(get_user_dir(), "shapeCache.json")
+    definitions.update(curvedata.load_cache(cachePath) or {})
+    store = shapestore.ShapeStore()
+    if store.exists():
+        definitions.update(store.load_all())
+
+    start = time.time()
+    icons, missing = [], []
+    for name, iconPath in jobs:
+        if name not in definitions:
+            missing.append(name)
+            continue
+        dirName = os.path.dirname(iconPath)
+        if not os.path.isdir(dirName):
+            os.makedirs(dirName)
+        with fileutil.atomic_write(iconPath, "wb") as f:
+            f.write(pngio.encode(size, size,
+                                 raster.render(definitions[name], size, size, view)))
+        icons.append(iconPath)
+    return {"jobs": [{"icons": icons, "missing": missing, "ok": not missing}],
+            "seconds": time.time() - start,
+            "failed": len(missing)}
+
+
+def render_library_icons(workers=None, force=False, interpreter=None,
+                         script=None, rasterize=False, size=32, view="iso"):
+    """Render the missing and stale icons of the library across a pool of
+    worker processes, or draw them in this process with rasterize, then
+    pack them into the atlas. The view only applies when rasterizing, Maya
+    renders through the camera of the workers.
+    """
+    jobs = get_icon_jobs(force)
+    if rasterize:
+        report = draw_icons(jobs, size, view)
+    else:
+        workers = workers or multiprocessing.cpu_count()
+        report = run_manifest(get_icon_manifest(jobs, workers, size),
+                              workers, interpreter, script)
+
+    rootPath = os.path.dirname(os.path.abspath(__file__))
+    atlasPath = os.path.join(rootPath, "icon", "atlas.png")
+    if os.path.exists(atlasPath):
+        report["packed"] = atlas.pack(os.path.join(rootPath, "icon", "controller"),
+                                      atlasPath)
+    return report
+
+
+def get_jobs(manifest):
+    """Return one spec per scene of a manifest, the top level controls
+    being used by every job that does not define its own.
+    """
+    jobs = []
+    for job in manifest.get("jobs", []):
+        spec = {"controls": manifest.get("controls", [])}
+        spec.update(job)
+        jobs.append(spec)
+    return jobs
+
+
+def run_job(spec, interpreter="mayapy", script=None, tempDir=None):
+    """Build one spec in a separate interpreter process.
+
+    Args:
+        spec (dict): spec of a single scene
+        interpreter (string or list): command starting the interpreter
+        script (string): script run by the interpreter, this file by default
+        tempDir (string): directory for the spec and report files
+
+    Returns:
+        dict: report of the job with its timing and failure if any
+    """
+    handle, specPath = tempfile.mkstemp(suffix=".json", dir=tempDir)
+    with os.fdopen(handle, "w") as f:
+        json.dump(spec, f)
+    reportPath = specPath.replace(".json", "_report.json")
+
+    if isinstance(interpreter, (list, tuple)):
+        command = list(interpreter)
+    else:
+        command = [interpreter]
+    command += [script or os.path.abspath(__file__), specPath, "--report", reportPath]
+
+    report = {"scene": spec.get("scene"), "output": spec.get("output")}
+    start = time.time()
+    try:
+        process = subprocess.Popen(command,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        report["returncode"] = process.returncode
+        if os.path.exists(reportPath):
+            with open(reportPath, "r") as f:
+                report.update(json.load(f))
+        if process.returncode and not report.get("error"):
+            report["error"] = err.decode("utf-8", "replace")[-2000:]
+    except (IOError, OSError) as e:
+        report["returncode"] = None
+        report["error"] = str(e)
+
+    report["seconds"] = time.time() - start
+    report["ok"] = (report["returncode"] == 0 and not report.get("error") and
+                    not report.get("missing"))
+    return report
+
+
+def run_manifest(manifest, workers=None, interpreter=None, script=None):
+    """Build every scene of a manifest across a pool of worker processes.
+
+    Returns:
+        dict: per scene reports with the total time and number of failures,
+            a job counting once or once per shape whose icon it could not
+            make
+    """
+    jobs = get_jobs(manifest)
+    workers = workers or manifest.get("workers") or multiprocessing.cpu_count()
+    interpreter = interpreter or manifest.get("interpreter") or "mayapy"
+
+    tempDir = tempfile.mkdtemp(prefix="ctrlLibrary_")
+    start = time.time()
+    pool = ThreadPool(max(1, min(workers, len(jobs) or 1)))
+    try:
+        reports = pool.map(lambda spec: run_job(spec, interpreter, script, tempDir), jobs)
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    return {"jobs": reports,
+            "seconds": time.time() - start,
+            "failed": sum(len(r.get("missing") or [None]) for r in reports
+                          if not r["ok"])}
+
+
+def write_report(report, path=None):
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build controllers from a json spec.")
+    parser.add_argument("spec", nargs="?", help="path to the json spec")
+    parser.add_argument("--scene", help="scene to open, overrides the spec")
+    parser.add_argument("--output", help="path to save the scene to, overrides the spec")
+    parser.add_argument("--manifest", help="build every scene of a manifest")
+    parser.add_argument("--icons", action="store_true",
+                        help="render the missing and stale icons of the library")
+    parser.add_argument("--force", action="store_true",
+                        help="render every icon of the library with --icons")
+    parser.add_argument("--raster", action="store_true",
+                        help="draw the icons from curve data without Maya with --icons")
+    parser.add_argument("--size", type=int, default=32,
+                        help="width and height of the icons with --icons")
+    parser.add_argument("--view", choices=raster.VIEWS, default="iso",
+                        help="view the icons are drawn in with --raster")
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument("--interpreter", help="interpreter of the workers, mayapy by default")
+    parser.add_argument("--script", help="script run by the workers, this file by default")
+    parser.add_argument("--report", help="path to write the json report to")
+    args = parser.parse_args(argv)
+
+    if args.icons:
+        report = render_library_icons(workers=args.workers,
+                                      force=args.force,
+                                      interpreter=args.interpreter,
+                                      script=args.script,
+                                      rasterize=args.raster,
+                                      size=args.size,
+                                      view=args.view)
+        write_report(report, args.report)
+        return 1 if report["failed"] else 0
+
+    if args.manifest:
+        report = run_manifest(load_spec(args.manifest),
+                              workers=args.workers,
+                              interpreter=args.interpreter,
+                              script=args.script)
+        write_report(report, args.report)
+        return 1 if report["failed"] else 0
+
+    if not args.spec:
+        parser.error("a spec or a manifest is required")
+
+    spec = load_spec(args.spec)
+    if args.scene:
+        spec["scene"] = args.scene
+    if args.output:
+        spec["output"] = args.output
+
+    try:
+        result = run_spec(spec)
+    except Exception:
+        write_report({"error": traceback.format_exc()}, args.report)
+        return 1
+
+    write_report(result, args.report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Curve shape definitions.
+
+A shape definition is the list of nurbsCurve shapes a controller is made
+of. Each curve is stored as a plain dict so that it can be cached in
+memory, written to disk and rebuilt without touching the procedural
+shape functions again.
+
+    {"degree": 3, "form": 2, "knots": [...], "cvs": [[x, y, z], ...]}
+
+Definitions are written either as json or in a compact little-endian
+binary format, read back with a single memory mapped read:
+
+    header: magic "CLSH", version (uint16), shape count (uint32)
+    shape:  name size (uint16), utf-8 name, curve count (uint16)
+    curve:  degree (uint8), form (uint8), knot count (uint32),
+            cv count (uint32), knots (float64 * n), cvs (float64 * 3n)
+
+================================================="""
+
+# Standard Modules
+import os
+import json
+import mmap
+import struct
+
+try:
+    from . import fileutil
+except (ImportError, ValueError):
+    # run as a script outside of Maya
+    import fileutil
+
+
+OPEN = 0
+CLOSED = 1
+PERIODIC = 2
+
+MAGIC = b"CLSH"
+BINARY_VERSION = 1
+BINARY_EXT = ".clsh"
+JSON_EXT = ".json"
+CACHE_VERSION = 1
+
+_HEADER = struct.Struct("<4sHI")
+_NAME = struct.Struct("<H")
+_CURVE = struct.Struct("<BBII")
+
+
+def make_curve(degree, form, knots, cvs):
+    """Return a curve definition from raw nurbsCurve data.
+
+    Args:
+        degree (int): degree of the curve
+        form (int): OPEN, CLOSED or PERIODIC
+        knots (list): knot vector
+        cvs (list): control points as [x, y, z] lists
+
+    Returns:
+        dict: curve definition
+    """
+    return {"degree": int(degree),
+            "form": int(form),
+            "knots": [float(k) for k in knots],
+            "cvs": [[float(v) for v in cv[:3]] for cv in cvs]}
+
+
+def is_periodic(curve):
+    return curve["form"] == PERIODIC
+
+
+def same_knots(knots, other, tolerance=1e-6):
+    """Return True when two knot vectors are equal within tolerance.
+    """
+    return (len(knots) == len(other) and
+            all(abs(a - b) <= tolerance for a, b in zip(knots, other)))
+
+
+def load(path):
+    """Return the shape definitions stored in a json file.
+
+    Args:
+        path (string): path to the json file
+
+    Returns:
+        dict: shape name -> list of curve definitions
+    """
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def dump(definitions, path):
+    """Write shape definitions to a json file, replacing it atomically.
+
+    Args:
+        definitions (dict): shape name -> list of curve definitions
+        path (string): path to the json file
+    """
+    with fileutil.atomic_write(path) as f:
+        json.dump(definitions, f, sort_keys=True, separators=(",", ":"))
+
+
+def load_cache(path, source=None):
+    """Return the shape definitions of a cache file, or None when the cache
+    is missing or was written by another version or for another source.
+
+    Args:
+        path (string): path to the cache file
+        source: stamp of the code the shapes were built by, not checked
+            when None
+
+    Returns:
+        dict: shape name -> list of curve definitions
+    """
+    try:
+        cache = load(path)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return None
+    if source is not None and cache.get("source") != source:
+        return None
+    return cache.get("shapes", {})
+
+
+def dump_cache(definitions, path, source=None):
+    """Write shape definitions to a cache file stamped with the version of
+    the format and the source they were built by.
+    """
+    cache = {"version": CACHE_VERSION,
+             "source": source,
+             "shapes": definitions}
+    with fileutil.atomic_write(path) as f:
+        json.dump(cache, f, sort_keys=True, separators=(",", ":"))
+
+
+def encode(definitions):
+    """Return shape definitions in the binary format.
+
+    Args:
+        definitions (dict): shape name -> list of curve definitions
+
+    Returns:
+        bytes: binary data
+    """
+    chunks = [_HEADER.pack(MAGIC, BINARY_VERSION, len(definitions))]
+    for name in sorted(definitions):
+        encoded = name.encode("utf-8")
+        curves = definitions[name]
+        chunks.append(_NAME.pack(len(encoded)) + encoded)
+        chunks.append(_NAME.pack(len(curves)))
+        for curve in curves:
+            knots = curve["knots"]
+            cvs = [v for cv in curve["cvs"] for v in cv[:3]]
+            chunks.append(_CURVE.pack(curve["degree"], curve["form"],
+                                      len(knots), len(cvs) // 3))
+            chunks.append(struct.pack("<{}d".format(len(knots)), *knots))
+            chunks.append(struct.pack("<{}d".format(len(cvs)), *cvs))
+    return b"".join(chunks)
+
+
+def decode(data, offset=0):
+    """Return the shape definitions of binary data.
+
+    Args:
+        data (bytes or mmap): binary data
+        offset (int): position of the header in data
+
+    Returns:
+        dict: shape name -> list of curve definitions
+    """
+    magic, version, count = _HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError("not a curve shape file")
+    if version != BINARY_VERSION:
+        raise ValueError("unsupported curve shape file version {}".format(version))
+    pos = offset + _HEADER.size
+
+    definitions = {}
+    for i in range(count):
+        size, = _NAME.unpack_from(data, pos)
+        pos += _NAME.size
+        name = data[pos:pos + size].decode("utf-8")
+        pos += size
+        numberOfCurves, = _NAME.unpack_from(data, pos)
+        pos += _NAME.size
+
+        curves = []
+        for n in range(numberOfCurves):
+            degree, form, numberOfKnots, numberOfCvs = _CURVE.unpack_from(data, pos)
+            pos += _CURVE.size
+            knots = struct.unpack_from("<{}d".format(numberOfKnots), data, pos)
+            pos += numberOfKnots * 8
+            values = struct.unpack_from("<{}d".format(numberOfCvs * 3), data, pos)
+            pos += numberOfCvs * 24
+            curves.append({"degree": degree,
+                           "form": form,
+                           "knots": list(knots),
+                           "cvs": [list(values[v:v + 3])
+                                   for v in range(0, len(values), 3)]})
+        definitions[name] = curves
+    return definitions
+
+
+def load_binary(path):
+    """Return the shape definitions stored in a binary file.
+    """
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            raise ValueError("empty curve shape file")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return decode(data)
+        finally:
+            data.close()
+
+
+def dump_binary(definitions, path):
+    """Write shape definitions to a binary file, replacing it atomically.
+    """
+    with fileutil.atomic_write(path, "wb") as f:
+        f.write(encode(definitions))
+
+
+def load_file(path):
+    """Return the shape definitions of a binary or json file, told apart
+    by their extension.
+    """
+    if os.path.splitext(path)[1].lower() == BINARY_EXT:
+        return load_binary(path)
+    return load(path)
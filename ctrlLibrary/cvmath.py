@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Control vertex math.
+
+4x4 matrices and point transforms used to edit controller shapes at the
+CV level. Matrices follow the Maya convention: row vectors multiplied on
+the left, translation in the last row.
+
+Points are transformed in one array operation with numpy when it is
+available, and with plain Python otherwise.
+
+================================================="""
+
+# Standard Modules
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+
+def identity():
+    return [[1.0, 0.0, 0.0, 0.0],
+            [0.0, 1.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0]]
+
+
+def as_matrix(values):
+    """Return a 4x4 matrix from nested rows or 16 values, as returned by
+    xform or getAttr on a matrix attribute.
+    """
+    values = list(values)
+    if len(values) == 16:
+        return [[float(v) for v in values[row * 4:row * 4 + 4]] for row in range(4)]
+    return [[float(v) for v in row] for row in values]
+
+
+def compose(scale=None, rotate=None, matrix=None, order="xyz"):
+    """Return the matrix scaling, then rotating by euler angles in degrees,
+    then multiplying by matrix, any of them being optional.
+    """
+    result = identity()
+    if scale is not None:
+        result = multiply(result, scale_matrix(*scale))
+    if rotate is not None:
+        result = multiply(result, euler_matrix(*rotate, order=order))
+    if matrix is not None:
+        result = multiply(result, as_matrix(matrix))
+    return result
+
+
+def multiply(a, b):
+    """Return the matrix product a * b, a being applied first.
+    """
+    return [[sum(a[row][i] * b[i][col] for i in range(4)) for col in range(4)]
+            for row in range(4)]
+
+
+def translate_matrix(x, y, z):
+    matrix = identity()
+    matrix[3][:3] = [float(x), float(y), float(z)]
+    return matrix
+
+
+def scale_matrix(x, y=None, z=None):
+    """Return a scale matrix, uniform when only x is given.
+    """
+    y = x if y is None else y
+    z = x if z is None else z
+    matrix = identity()
+    matrix[0][0], matrix[1][1], matrix[2][2] = float(x), float(y), float(z)
+    return matrix
+
+
+def rotate_matrix(axis, degrees):
+    """Return the rotation matrix of degrees around the "x", "y" or "z"
+    axis.
+    """
+    radians = math.radians(degrees)
+    c = math.cos(radians)
+    s = math.sin(radians)
+    i = AXES[axis.lower()]
+    j, k = [n for n in range(3) if n != i]
+    if i == 1:
+        j, k = k, j
+    matrix = identity()
+    matrix[j][j], matrix[j][k] = c, s
+    matrix[k][j], matrix[k][k] = -s, c
+    return matrix
+
+
+def euler_matrix(x, y, z, order="xyz"):
+    """Return the rotation matrix of euler angles in degrees, rotated in
+    the given order as Maya does.
+    """
+    angles = {"x": x, "y": y, "z": z}
+    matrix = identity()
+    for axis in order.lower():
+        matrix = multiply(matrix, rotate_matrix(axis, angles[axis]))
+    return matrix
+
+
+def pivot_matrix(matrix, pivot):
+    """Return matrix applied about pivot instead of the origin.
+    """
+    x, y, z = pivot
+    return multiply(multiply(translate_matrix(-x, -y, -z), matrix),
+                    translate_matrix(x, y, z))
+
+
+def bounding_center(points):
+    """Return the center of the bounding box of points.
+    """
+    if not points:
+        return [0.0, 0.0, 0.0]
+    return [(min(p[i] for p in points) + max(p[i] for p in points)) * 0.5
+            for i in range(3)]
+
+
+def transform_points(points, matrix):
+    """Return points multiplied by matrix.
+
+    Args:
+        points (list): [x, y, z] points
+        matrix (list): 4x4 matrix
+
+    Returns:
+        list: transformed [x, y, z] points
+    """
+    if not points:
+        return []
+
+    if numpy is not None:
+        m = numpy.asarray(matrix, dtype=float)
+        p = numpy.asarray(points, dtype=float).reshape(-1, 3)
+        return (p.dot(m[:3, :3]) + m[3, :3]).tolist()
+
+    (a, b, c, _), (d, e, f, _), (g, h, i, _), (tx, ty, tz, _) = matrix
+    return [[x * a + y * d + z * g + tx,
+             x * b + y * e + z * h + ty,
+             x * c + y * f + z * i + tz] for x, y, z in points]
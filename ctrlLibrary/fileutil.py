@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Safe writes to the shared library.
+
+Files of the library can be written by several workstations at once.
+Writers take a lock file next to the target and write to a temporary file
+which is renamed over the target, so readers never block and never see a
+partially written file.
+
+================================================="""
+
+# Standard Modules
+import os
+import sys
+import uuid
+import time
+import errno
+import shutil
+import socket
+import tempfile
+from contextlib import contextmanager
+
+
+LOCK_SUFFIX = ".lock"
+LOCK_TIMEOUT = 30.0
+LOCK_STALE = 120.0
+LOCK_INTERVAL = 0.05
+FILE_MODE = 0o644
+
+
+class LockError(IOError):
+    pass
+
+
+def get_lock_path(path):
+    return path + LOCK_SUFFIX
+
+
+@contextmanager
+def lock(path, timeout=LOCK_TIMEOUT, stale=LOCK_STALE):
+    """Hold the lock file of path while the block runs.
+
+    The lock is created atomically with O_EXCL, which also works on network
+    shares, and holds the host, process ID and a token of its owner. A
+    lock is left over by a crashed writer and broken when its owner process
+    is gone on this host, or when it is older than stale seconds. The age
+    is compared with the clock of this machine, so stale must be well above
+    the clock drift between the workstations sharing the library.
+
+    Args:
+        path (string): file to lock
+        timeout (float): seconds to wait for the lock
+        stale (float): age in seconds after which a lock is broken
+
+    Raises:
+        LockError: when the lock could not be taken in time, or the lock
+            file cannot be created at all
+    """
+    lockPath = get_lock_path(path)
+    owner = "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+    start = time.time()
+    while True:
+        try:
+            handle = os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError as e:
+            if not _is_held(e, lockPath):
+                raise LockError("could not lock {}: {}".format(path, e))
+
+        current = _read_owner(lockPath)
+        try:
+            age = time.time() - os.path.getmtime(lockPath)
+        except OSError:
+            # released in the meantime
+            age = None
+        if current is not None and age is not None and (age > stale or _is_dead(current)):
+            _break_lock(lockPath, current)
+        if time.time() - start > timeout:
+            raise LockError("could not lock {}".format(path))
+        time.sleep(LOCK_INTERVAL)
+
+    try:
+        os.write(handle, owner.encode("utf-8"))
+        os.close(handle)
+        yield lockPath
+    finally:
+        # the lock may have been broken and taken by another writer
+        if _read_owner(lockPath) == owner:
+            try:
+                os.remove(lockPath)
+            except OSError:
+                pass
+
+
+def _is_held(error, lockPath):
+    """Return True when creating the lock file failed because another
+    writer holds the lock. Windows reports a lock file being removed as
+    access denied.
+    """
+    if error.errno == errno.EEXIST:
+        return True
+    return (error.errno == errno.EACCES and sys.platform == "win32" and
+            os.path.exists(lockPath))
+
+
+def _read_owner(lockPath):
+    try:
+        with open(lockPath, "rb") as f:
+            return f.read().decode("utf-8", "replace")
+    except (IOError, OSError):
+        return None
+
+
+def _is_dead(owner):
+    """Return True when owner is a process of this host that has exited.
+    """
+    parts = owner.split(":")
+    if len(parts) != 3 or parts[0] != socket.gethostname():
+        return False
+    if sys.platform == "win32":
+        return False
+    try:
+        os.kill(int(parts[1]), 0)
+    except ValueError:
+        return False
+    except OSError as e:
+        return e.errno == errno.ESRCH
+    return False
+
+
+def _break_lock(lockPath, owner):
+    """Remove the lock of a stale owner, leaving a newer lock in place.
+
+    The lock is first renamed to a unique name, which only one waiter can
+    do, and only removed when it still belongs to the stale owner. A lock
+    taken by another writer in the meantime is linked back, which fails
+    rather than overwrite a lock created since.
+    """
+    breakPath = "{}.{}.break".format(lockPath, uuid.uuid4().hex)
+    try:
+        os.rename(lockPath, breakPath)
+    except OSError:
+        return
+
+    if _read_owner(breakPath) != owner:
+        try:
+            if hasattr(os, "link") and sys.platform != "win32":
+                os.link(breakPath, lockPath)
+            else:
+                os.rename(breakPath, lockPath)
+                return
+        except OSError:
+            pass
+    try:
+        os.remove(breakPath)
+    except OSError:
+        pass
+
+
+def replace(source, target):
+    """Rename source over target in one step.
+    """
+    if hasattr(os, "replace"):
+        os.replace(source, target)
+    elif sys.platform == "win32":
+        if os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+    else:
+        os.rename(source, target)
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """Yield a temporary file which replaces path once the block is done.
+
+    Nothing is written to path when the block raises.
+    """
+    dirName = os.path.dirname(os.path.abspath(path))
+    handle, tempPath = tempfile.mkstemp(prefix=".{}.".format(os.path.basename(path)),
+                                        suffix=".tmp",
+                                        dir=dirName)
+    try:
+        with os.fdopen(handle, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # temporary files are private, keep the library readable by all
+        try:
+            os.chmod(tempPath, os.stat(path).st_mode & 0o777)
+        except OSError:
+            os.chmod(tempPath, FILE_MODE)
+        replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+
+def atomic_move(source, target):
+    """Move a file into place so the target is either the old or the new
+    file, also across drives.
+    """
+    with open(source, "rb") as src:
+        with atomic_write(target, "wb") as f:
+            shutil.copyfileobj(src, f)
+    os.remove(source)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Icon layout index.
+
+Turns the contents of data/iconLayout.json into an ordered index of
+tab -> sub-tab -> layout slot, and keeps a compact pre-sorted copy of that
+index on disk so the icon grid can be built without parsing and sorting
+the layout file on every launch.
+
+Icon paths are stored relative to the icon/controller directory of the
+package, with "/" separators, and resolved against a single scan of that
+directory.
+
+    [[tabName, numberOfTab, [[tabIndex, [[name, path, layoutIndex], ...]], ...]], ...]
+
+================================================="""
+
+# Standard Modules
+import os
+import json
+import random
+import timeit
+
+try:
+    from . import fileutil
+except (ImportError, ValueError):
+    # run as a script outside of Maya
+    import fileutil
+
+
+CACHE_VERSION = 2
+ICON_ROOT = "icon/controller/"
+
+
+def build_index(data, collisions=None):
+    """Return the layout data ordered by tab, sub-tab and layout slot.
+
+    Every entry is collected in one pass and sorted once. Entries sharing
+    the same tabIndex and layoutIndex are all kept, ordered by name, and
+    reported in collisions.
+
+    Args:
+        data (dict): contents of the icon layout file
+        collisions (list): receives [tabName, tabIndex, layoutIndex, name]
+            for every entry placed on an already used slot
+
+    Returns:
+        list: [tabName, numberOfTab, subTabs] ordered by indexOrder
+    """
+    tabs = {}
+    entries = []
+    for tabName, tabInfo in data.items():
+        order = tabInfo["indexOrder"]
+        tabs[tabName] = [order, [tabName, tabInfo["numberOfTab"], []]]
+        for name, content in tabInfo["contents"].items():
+            path = relative_icon_path(content["path"])
+            entries.append((order, tabName, content["tabIndex"],
+                            content["layoutIndex"], name, path))
+    entries.sort()
+
+    lastSlot = None
+    subTab = None
+    for order, tabName, tabIndex, layoutIndex, name, path in entries:
+        subTabs = tabs[tabName][1][2]
+        if not subTabs or subTabs[-1][0] != tabIndex:
+            subTab = [tabIndex, []]
+            subTabs.append(subTab)
+
+        slot = (tabName, tabIndex, layoutIndex)
+        if slot == lastSlot and collisions is not None:
+            collisions.append([tabName, tabIndex, layoutIndex, name])
+        lastSlot = slot
+        subTab[1].append([name, path, layoutIndex])
+
+    return [tab for order, tab in sorted(tabs.values(), key=lambda x: x[0])]
+
+
+def add_entries(data, entries):
+    """Return a copy of the layout data holding extra entries.
+
+    Args:
+        data (dict): contents of the icon layout file
+        entries (dict): name -> [tabName, tabIndex, layoutIndex, path],
+            tabs missing from data being added after the others
+
+    Returns:
+        dict: layout data
+    """
+    merged = {}
+    for tabName, tabInfo in data.items():
+        merged[tabName] = dict(tabInfo, contents=dict(tabInfo["contents"]))
+
+    for name, (tabName, tabIndex, layoutIndex, path) in entries.items():
+        if tabName not in merged:
+            order = max([tab["indexOrder"] for tab in merged.values()] or [0])
+            merged[tabName] = {"indexOrder": order + 1,
+                               "numberOfTab": 1,
+                               "contents": {}}
+        tab = merged[tabName]
+        tab["numberOfTab"] = max(tab["numberOfTab"], tabIndex)
+        tab["contents"][name] = {"path": path or "",
+                                 "tabIndex": tabIndex,
+                                 "layoutIndex": layoutIndex}
+    return merged
+
+
+def next_slot(tabs, tabName):
+    """Return (tabIndex, layoutIndex) of the slot after the last one used
+    in the last sub-tab of a tab of the index.
+    """
+    for name, numberOfTab, subTabs in tabs:
+        if name == tabName and subTabs:
+            tabIndex, slots = subTabs[-1]
+            return tabIndex, max(slot[2] for slot in slots) + 1
+    return 1, 1
+
+
+def relative_icon_path(path):
+    """Return an icon path relative to the icon/controller directory.
+
+    Layout files written by older versions hold absolute paths of the
+    machine they were saved on; everything up to the icon root is dropped.
+    """
+    path = path.replace("\\", "/")
+    index = path.rfind(ICON_ROOT)
+    if index != -1:
+        path = path[index + len(ICON_ROOT):]
+    return path
+
+
+def scan_icons(rootPath):
+    """Return every png under rootPath as relative path -> absolute path,
+    collected with a single walk of the directory.
+    """
+    icons = {}
+    for dirPath, dirNames, fileNames in os.walk(rootPath):
+        relDir = os.path.relpath(dirPath, rootPath).replace(os.sep, "/")
+        for fileName in fileNames:
+            if not fileName.lower().endswith(".png"):
+                continue
+            if relDir == ".":
+                relPath = fileName
+            else:
+                relPath = "{}/{}".format(relDir, fileName)
+            icons[relPath] = os.path.join(dirPath, fileName)
+    return icons
+
+
+def missing_icons(tabs, icons):
+    """Return the relative icon paths used by the index but not found by
+    scan_icons.
+    """
+    used = set(slot[1] for tab in tabs for subTab in tab[2] for slot in subTab[1])
+    return used - set(icons)
+
+
+def icon_jobs(tabs, rootPath, times=None, force=False):
+    """Return [name, icon path] of every slot of the index whose icon is
+    missing or older than its shape.
+
+    Args:
+        tabs (list): index built by build_index
+        rootPath (string): icon directory the relative paths are under
+        times (dict): name -> time the shape was last changed
+        force (bool): return every slot
+
+    Returns:
+        list: [name, absolute icon path]
+    """
+    times = times or {}
+    jobs = []
+    for tab in tabs:
+        for subTab in tab[2]:
+            for name, path, layoutIndex in subTab[1]:
+                if not path:
+                    continue
+                if os.path.isabs(path):
+                    iconPath = path
+                else:
+                    iconPath = os.path.join(rootPath, *path.split("/"))
+                if not force and os.path.exists(iconPath):
+                    if os.path.getmtime(iconPath) >= times.get(name, 0):
+                        continue
+                jobs.append([name, iconPath])
+    return jobs
+
+
+def stamp(path):
+    """Return the modification time and size identifying a file version.
+    """
+    info = os.stat(path)
+    return [info.st_mtime, info.st_size]
+
+
+def source_stamp(sourcePath, extra=None):
+    """Return the stamp of the layout file, together with the stamp of the
+    other sources of the index when extra is given.
+    """
+    if extra is None:
+        return stamp(sourcePath)
+    return [stamp(sourcePath), extra]
+
+
+def load_index(cachePath, sourcePath, extra=None):
+    """Return the cached index, or None when the cache is missing or was
+    written for another version of the layout file or of extra, the stamp
+    of the other sources merged into the index.
+    """
+    try:
+        with open(cachePath, "r") as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if cache.get("version") != CACHE_VERSION:
+        return None
+    if cache.get("source") != source_stamp(sourcePath, extra):
+        return None
+    return cache["tabs"]
+
+
+def save_index(tabs, cachePath, sourcePath, extra=None):
+    cache = {"version": CACHE_VERSION,
+             "source": source_stamp(sourcePath, extra),
+             "tabs": tabs}
+    with fileutil.atomic_write(cachePath) as f:
+        json.dump(cache, f, separators=(",", ":"))
+
+
+def make_synthetic_data(count, numberOfTabs=5, numberOfSubTabs=7, seed=0):
+    """Return a layout with count entries spread over tabs and sub-tabs in
+    random order, as a large shared library would look like.
+    """
+    rand = random.Random(seed)
+    indices = list(range(count))
+    rand.shuffle(indices)
+
+    data = {}
+    for tab in range(numberOfTabs):
+        data["tab{}".format(tab)] = {"indexOrder": tab + 1,
+                                     "numberOfTab": numberOfSubTabs,
+                                     "contents": {}}
+    for i in indices:
+        tabName = "tab{}".format(i % numberOfTabs)
+        slot = i // numberOfTabs
+        data[tabName]["contents"]["shape{}".format(i)] = {
+            "path": "{}/shape{}.png".format(tabName, i),
+            "tabIndex": slot % numberOfSubTabs + 1,
+            "layoutIndex": slot // numberOfSubTabs + 1}
+    return data
+
+
+def benchmark(count=10000, repeat=5):
+    """Print the time taken to order a synthetic layout of count entries.
+    """
+    data = make_synthetic_data(count)
+    timer = timeit.Timer(lambda: build_index(data, []))
+    best = min(timer.repeat(repeat=repeat, number=1))
+
+    collisions = []
+    tabs = build_index(data, collisions)
+    slots = sum(len(sub[1]) for tab in tabs for sub in tab[2])
+    print("entries: {}  ordered: {}  collisions: {}".format(count, slots, len(collisions)))
+    print("build_index: {:.2f} ms".format(best * 1000.0))
+    return best
+
+
+if __name__ == "__main__":
+    benchmark()
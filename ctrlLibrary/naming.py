@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Controller naming.
+
+Unique names are handed out from a snapshot of the names already used in
+the scene, taken once per build, instead of asking the scene about every
+candidate. Names collide in the same way every time, so a build always
+produces the same names for the same scene.
+
+Naming conventions and the name tokens telling the side of a node are
+read from data/namingRules.json, or from the file set in the
+CTRL_LIBRARY_NAMING_RULES environment variable, and compiled once into
+regular expressions.
+
+================================================="""
+
+# Standard Modules
+import os
+import re
+import json
+from collections import OrderedDict
+
+
+ENV_RULES = "CTRL_LIBRARY_NAMING_RULES"
+
+
+def get_rules_path():
+    dirName = os.path.dirname(os.path.abspath(__file__))
+    default = os.path.join(dirName, "data", "namingRules.json")
+    return os.environ.get(ENV_RULES) or default
+
+
+class NameAllocator():
+    """Hand out unique names against a set of used names.
+
+    When a name is taken the first free name of its template is used, the
+    "@" of the template being replaced by 1, 2, 3...
+    """
+
+    PLACEHOLDER = "@"
+
+    def __init__(self, names=()):
+        self.used = set(names)
+        self.counters = {}
+
+    def reserve(self, name):
+        self.used.add(name)
+
+    def is_free(self, name):
+        return name not in self.used
+
+    def allocate(self, name, template=None):
+        """Return name if it is free, otherwise the first free name of
+        template, and mark the returned name as used.
+
+        Args:
+            name (string): preferred name
+            template (string): fallback name containing "@", name + "@"
+                by default
+
+        Returns:
+            string: unique name
+        """
+        if name not in self.used:
+            self.used.add(name)
+            return name
+
+        if template is None or self.PLACEHOLDER not in template:
+            template = name + self.PLACEHOLDER
+
+        index = self.counters.get(template, 1)
+        candidate = template.replace(self.PLACEHOLDER, str(index))
+        while candidate in self.used:
+            index += 1
+            candidate = template.replace(self.PLACEHOLDER, str(index))
+
+        self.counters[template] = index + 1
+        self.used.add(candidate)
+        return candidate
+
+
+class NamingRules():
+    """Naming conventions loaded from a json config.
+
+    Each convention is a list of rules tried in order; the first rule whose
+    pattern is found in a name rewrites it with re.sub. Tokens such as
+    {con} or {jnt} are filled in from the config before the patterns are
+    compiled, so deriving names is a regex substitution per node. The
+    conventions of a config are added to the built-in ones, which it can
+    override but not remove.
+
+        {"tokens": {"con": "CON", "jnt": "JNT"},
+         "conventions": {"ReelFX": [{"pattern": "{jnt}", "replace": "{con}"},
+                                    {"pattern": "^(.*)$", "replace": "\\1_{con}"}]}}
+    """
+
+    TOKENS = {"controlGrp": "control_GRP",
+              "con": "CON",
+              "jnt": "JNT",
+              "zero": "ZERO"}
+    CONVENTIONS = {"ReelFX": [{"pattern": "{jnt}", "replace": "{con}"},
+                              {"pattern": "^(.*)$", "replace": "\\1_{con}"}]}
+    SIDES = OrderedDict([("left", ["(^|_)[Ll](_|$)", "(^|_)[Ll]eft"]),
+                         ("right", ["(^|_)[Rr](_|$)", "(^|_)[Rr]ight"]),
+                         ("center", ["(^|_)[CcMm](_|$)", "(^|_)[Cc]enter"])])
+
+    def __init__(self, tokens=None, conventions=None, sides=None):
+        self.tokens = dict(self.TOKENS)
+        self.tokens.update(tokens or {})
+        merged = OrderedDict(self.CONVENTIONS)
+        merged.update(conventions or {})
+        self.rules = OrderedDict()
+        for name, rules in merged.items():
+            self.rules[name] = [self.compile_rule(rule) for rule in rules]
+        self.sides = OrderedDict()
+        for side, patterns in (sides or self.SIDES).items():
+            self.sides[side] = re.compile("|".join(
+                "(?:{})".format(self.expand(pattern)) for pattern in patterns))
+
+    @classmethod
+    def load(cls, path):
+        """Return the rules of a json config, or the default rules when the
+        config can not be read.
+        """
+        try:
+            with open(path, "r") as f:
+                config = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, OSError, ValueError) as e:
+            print(e)
+            return cls()
+        return cls(config.get("tokens"), config.get("conventions"),
+                   config.get("sides"))
+
+    def expand(self, pattern):
+        """Return a pattern with its tokens replaced by their escaped value.
+        """
+        for key, value in self.tokens.items():
+            pattern = pattern.replace("{%s}" % key, re.escape(value))
+        return pattern
+
+    def compile_rule(self, rule):
+        replace = rule["replace"]
+        for key, value in self.tokens.items():
+            replace = replace.replace("{%s}" % key, value.replace("\\", "\\\\"))
+        return re.compile(self.expand(rule["pattern"])), replace
+
+    def conventions(self):
+        return list(self.rules.keys())
+
+    def get_rules(self, convention):
+        """Return the compiled rules of a convention.
+
+        Raises:
+            ValueError: when there is no such convention
+        """
+        try:
+            return self.rules[convention]
+        except KeyError:
+            raise ValueError("unknown naming convention: {}".format(convention))
+
+    def derive(self, name, convention):
+        """Return the name given to name by a convention, or name itself
+        when no rule applies.
+        """
+        for pattern, replace in self.get_rules(convention):
+            if pattern.search(name):
+                return pattern.sub(replace, name)
+        return name
+
+    def derive_all(self, names, convention):
+        """Return the names given to every name of names by a convention.
+        """
+        rules = self.get_rules(convention)
+        derived = []
+        for name in names:
+            for pattern, replace in rules:
+                if pattern.search(name):
+                    name = pattern.sub(replace, name)
+                    break
+            derived.append(name)
+        return derived
+
+    def classify(self, names):
+        """Return the side of every name of names, the first side whose
+        tokens are found in the name, or None.
+        """
+        sides = list(self.sides.items())
+        found = []
+        for name in names:
+            for side, pattern in sides:
+                if pattern.search(name):
+                    found.append(side)
+                    break
+            else:
+                found.append(None)
+        return found
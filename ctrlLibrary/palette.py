@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Override color palette.
+
+The RGB value of every override color index, as shown by Maya, kept as a
+table so that the palette buttons, index <-> RGB conversions and studio
+color schemes all read from the same data.
+
+Nearest index lookups use numpy when it is available and fall back to
+plain Python otherwise.
+
+================================================="""
+
+# Standard Modules
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# index -> [r, g, b], index 0 being the default color of the node
+COLORS = [
+    [0.467, 0.467, 0.467],
+    [0.000, 0.000, 0.000],
+    [0.247, 0.247, 0.247],
+    [0.498, 0.498, 0.498],
+    [0.608, 0.000, 0.157],
+    [0.000, 0.016, 0.373],
+    [0.000, 0.000, 1.000],
+    [0.000, 0.275, 0.094],
+    [0.145, 0.000, 0.263],
+    [0.780, 0.000, 0.780],
+    [0.537, 0.278, 0.200],
+    [0.243, 0.133, 0.122],
+    [0.600, 0.145, 0.001],
+    [1.000, 0.000, 0.000],
+    [0.000, 1.000, 0.000],
+    [0.000, 0.255, 0.600],
+    [1.000, 1.000, 1.000],
+    [1.000, 1.000, 0.000],
+    [0.388, 0.863, 1.000],
+    [0.263, 1.000, 0.635],
+    [1.000, 0.686, 0.686],
+    [0.890, 0.675, 0.475],
+    [1.000, 1.000, 0.384],
+    [0.000, 0.600, 0.325],
+    [0.627, 0.412, 0.188],
+    [0.620, 0.627, 0.188],
+    [0.408, 0.627, 0.188],
+    [0.188, 0.627, 0.365],
+    [0.188, 0.627, 0.627],
+    [0.188, 0.404, 0.627],
+    [0.435, 0.188, 0.627],
+]
+
+DEFAULT = 0
+
+# scheme name -> side -> color index
+SCHEMES = OrderedDict([
+    ("default", {"left": 6, "right": 13, "center": 17}),
+    ("light", {"left": 18, "right": 20, "center": 22}),
+    ("dark", {"left": 15, "right": 4, "center": 25}),
+])
+
+
+def get_rgb(index):
+    return list(COLORS[index])
+
+
+def nearest_index(rgb, include_default=False):
+    """Return the color index closest to an [r, g, b] color.
+    """
+    return nearest_indices([rgb], include_default)[0]
+
+
+def nearest_indices(colors, include_default=False):
+    """Return the closest color index of every [r, g, b] color of colors.
+
+    Args:
+        colors (list): [r, g, b] colors from 0 to 1
+        include_default (bool): also match the default color, index 0
+
+    Returns:
+        list: color indices
+    """
+    first = 0 if include_default else 1
+    if not colors:
+        return []
+
+    if numpy is not None:
+        table = numpy.asarray(COLORS[first:], dtype=float)
+        values = numpy.asarray(colors, dtype=float).reshape(-1, 3)
+        distances = ((values[:, None, :] - table[None, :, :]) ** 2).sum(axis=2)
+        return (distances.argmin(axis=1) + first).tolist()
+
+    table = list(enumerate(COLORS))[first:]
+    indices = []
+    for r, g, b in colors:
+        best = None
+        for index, (tr, tg, tb) in table:
+            distance = (r - tr) ** 2 + (g - tg) ** 2 + (b - tb) ** 2
+            if best is None or distance < best[0]:
+                best = (distance, index)
+        indices.append(best[1])
+    return indices
+
+
+def get_scheme(name="default"):
+    """Return side -> color index of a scheme.
+    """
+    return SCHEMES[name]
+
+
+def map_scheme(sides, scheme="default"):
+    """Return the color index of every side name of sides in a scheme,
+    DEFAULT for sides the scheme does not define.
+    """
+    colors = SCHEMES[scheme] if not isinstance(scheme, dict) else scheme
+    return [colors.get(side, DEFAULT) for side in sides]
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Minimal png reader and writer.
+
+Reads non-interlaced 8 bit png files of any color type and writes RGBA
+png files, using only the standard library so that icons can be handled
+outside of Maya. Pixels are kept as a flat RGBA bytearray.
+
+================================================="""
+
+# Standard Modules
+import struct
+import zlib
+
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def read(path):
+    """Return (width, height, pixels) of a png file.
+    """
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+
+def write(path, width, height, pixels):
+    """Write RGBA pixels to a png file.
+    """
+    with open(path, "wb") as f:
+        f.write(encode(width, height, pixels))
+
+
+def decode(data):
+    """Return (width, height, pixels) of png data, pixels being a flat
+    RGBA bytearray.
+    """
+    if data[:8] != SIGNATURE:
+        raise ValueError("not a png file")
+
+    header = None
+    palette = None
+    transparency = None
+    chunks = []
+    pos = 8
+    while pos < len(data):
+        length, chunkType = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += length + 12
+        if chunkType == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif chunkType == b"PLTE":
+            palette = bytearray(chunk)
+        elif chunkType == b"tRNS":
+            transparency = bytearray(chunk)
+        elif chunkType == b"IDAT":
+            chunks.append(chunk)
+        elif chunkType == b"IEND":
+            break
+
+    if header is None:
+        raise ValueError("png header not found")
+    width, height, depth, colorType, compression, filtering, interlace = header
+    if depth != 8 or interlace or colorType not in CHANNELS:
+        raise ValueError("unsupported png format")
+
+    bpp = CHANNELS[colorType]
+    stride = width * bpp
+    raw = bytearray(zlib.decompress(b"".join(chunks)))
+
+    pixels = bytearray(width * height * 4)
+    prev = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        line = _unfilter(raw[start], raw[start + 1:start + 1 + stride], prev, bpp)
+        _to_rgba(line, colorType, palette, transparency,
+                 pixels, y * width * 4)
+        prev = line
+    return width, height, pixels
+
+
+def encode(width, height, pixels):
+    """Return png data for a flat RGBA bytearray.
+    """
+    stride = width * 4
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)
+        raw.extend(pixels[y * stride:(y + 1) * stride])
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"".join([SIGNATURE,
+                     _chunk(b"IHDR", header),
+                     _chunk(b"IDAT", zlib.compress(bytes(raw), 9)),
+                     _chunk(b"IEND", b"")])
+
+
+def _chunk(chunkType, data):
+    crc = zlib.crc32(chunkType + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + chunkType + data + struct.pack(">I", crc)
+
+
+def _unfilter(filterType, line, prev, bpp):
+    if filterType == 0:
+        return line
+    for i in range(len(line)):
+        left = line[i - bpp] if i >= bpp else 0
+        up = prev[i]
+        if filterType == 1:
+            value = left
+        elif filterType == 2:
+            value = up
+        elif filterType == 3:
+            value = (left + up) // 2
+        elif filterType == 4:
+            upLeft = prev[i - bpp] if i >= bpp else 0
+            p = left + up - upLeft
+            pa, pb, pc = abs(p - left), abs(p - up), abs(p - upLeft)
+            if pa <= pb and pa <= pc:
+                value = left
+            elif pb <= pc:
+                value = up
+            else:
+                value = upLeft
+        else:
+            raise ValueError("unknown png filter {}".format(filterType))
+        line[i] = (line[i] + value) & 0xff
+    return line
+
+
+def _to_rgba(line, colorType, palette, transparency, pixels, offset):
+    if colorType == 6:
+        pixels[offset:offset + len(line)] = line
+        return
+
+    bpp = CHANNELS[colorType]
+    for i in range(len(line) // bpp):
+        o = offset + i * 4
+        if colorType == 2:
+            pixels[o:o + 3] = line[i * 3:i * 3 + 3]
+            pixels[o + 3] = 255
+        elif colorType == 0:
+            pixels[o:o + 3] = bytearray([line[i]] * 3)
+            pixels[o + 3] = 255
+        elif colorType == 4:
+            pixels[o:o + 3] = bytearray([line[i * 2]] * 3)
+            pixels[o + 3] = line[i * 2 + 1]
+        elif colorType == 3:
+            index = line[i]
+            pixels[o:o + 3] = palette[index * 3:index * 3 + 3]
+            if transparency is not None and index < len(transparency):
+                pixels[o + 3] = transparency[index]
+            else:
+                pixels[o + 3] = 255
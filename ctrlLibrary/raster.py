@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Icon rasterizer.
+
+Draws anti-aliased controller icons straight from curve definitions, so
+icons can be made without Maya, its renderer or paint effects strokes.
+Curves are evaluated from their CVs and knots with de Boor's algorithm,
+projected with a fixed orthographic or isometric view, fitted to the icon
+and drawn as lines of constant width.
+
+Coverage is computed with numpy when it is available and with plain
+Python otherwise.
+
+Usage:
+    python raster.py shapes.clsh outDir [--view iso] [--size 32]
+
+================================================="""
+
+# Standard Modules
+import os
+import sys
+import math
+import argparse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from . import pngio
+    from . import curvedata
+except (ImportError, ValueError):
+    # run as a script outside of Maya
+    import pngio
+    import curvedata
+
+
+VIEWS = ("iso", "top", "front", "side")
+COLOR = (67, 255, 163)
+LINE_WIDTH = 1.5
+MARGIN = 2.0
+SAMPLES = 8
+
+_COS30 = math.cos(math.radians(30.0))
+
+
+def evaluate(curve, samples=SAMPLES):
+    """Return points along a curve definition.
+
+    Args:
+        curve (dict): curve definition of curvedata
+        samples (int): points per span
+
+    Returns:
+        list: [x, y, z] points
+    """
+    degree = curve["degree"]
+    cvs = curve["cvs"]
+    if degree == 1 or len(cvs) <= degree:
+        points = [list(cv) for cv in cvs]
+        if curve["form"] != curvedata.OPEN and points and points[0] != points[-1]:
+            points.append(points[0])
+        return points
+
+    # Maya leaves out the first and last knot of the vector
+    knots = curve["knots"]
+    knots = [knots[0]] + list(knots) + [knots[-1]]
+    count = len(cvs)
+
+    points = []
+    span = degree
+    for span in range(degree, count):
+        start, end = knots[span], knots[span + 1]
+        if end <= start:
+            continue
+        for i in range(samples):
+            u = start + (end - start) * i / float(samples)
+            points.append(_de_boor(span, u, knots, cvs, degree))
+    points.append(_de_boor(span, knots[count], knots, cvs, degree))
+    return points
+
+
+def _de_boor(span, u, knots, cvs, degree):
+    d = [list(cvs[j + span - degree]) for j in range(degree + 1)]
+    for r in range(1, degree + 1):
+        for j in range(degree, r - 1, -1):
+            left = knots[j + span - degree]
+            right = knots[j + 1 + span - r]
+            alpha = 0.0 if right == left else (u - left) / (right - left)
+            d[j] = [(1.0 - alpha) * a + alpha * b for a, b in zip(d[j - 1], d[j])]
+    return d[degree]
+
+
+def project(points, view="iso"):
+    """Return the 2D image position of points, v growing downward.
+    """
+    if view == "top":
+        return [(x, z) for x, y, z in points]
+    if view == "front":
+        return [(x, -y) for x, y, z in points]
+    if view == "side":
+        return [(-z, -y) for x, y, z in points]
+    if view == "iso":
+        return [((x - z) * _COS30, (x + z) * 0.5 - y) for x, y, z in points]
+    raise ValueError("unknown view {}".format(view))
+
+
+def fit(polylines, width, height, margin=MARGIN):
+    """Return polylines scaled and centered to fill the icon.
+    """
+    values = [p for line in polylines for p in line]
+    if not values:
+        return polylines
+    minU = min(p[0] for p in values)
+    maxU = max(p[0] for p in values)
+    minV = min(p[1] for p in values)
+    maxV = max(p[1] for p in values)
+
+    sizeU = max(maxU - minU, 1e-9)
+    sizeV = max(maxV - minV, 1e-9)
+    scale = min((width - 2 * margin) / sizeU, (height - 2 * margin) / sizeV)
+    offsetU = (width - sizeU * scale) * 0.5 - minU * scale
+    offsetV = (height - sizeV * scale) * 0.5 - minV * scale
+    return [[(u * scale + offsetU, v * scale + offsetV) for u, v in line]
+            for line in polylines]
+
+
+def coverage(polylines, width, height, lineWidth=LINE_WIDTH):
+    """Return the line coverage of every pixel, row by row, from 0 to 1.
+    """
+    radius = lineWidth * 0.5
+    segments = [(line[i], line[i + 1]) for line in polylines
+                for i in range(len(line) - 1)]
+
+    if numpy is not None:
+        cover = numpy.zeros((height, width))
+        xs = numpy.arange(width) + 0.5
+        ys = numpy.arange(height) + 0.5
+        for (x0, y0), (x1, y1) in segments:
+            left, right, top, bottom = _bounds(x0, y0, x1, y1, radius, width, height)
+            if left >= right or top >= bottom:
+                continue
+            px = xs[left:right][None, :]
+            py = ys[top:bottom][:, None]
+            dx, dy = x1 - x0, y1 - y0
+            length = dx * dx + dy * dy
+            if length:
+                t = numpy.clip(((px - x0) * dx + (py - y0) * dy) / length, 0.0, 1.0)
+            else:
+                t = 0.0
+            distance = numpy.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+            value = numpy.clip(radius + 0.5 - distance, 0.0, 1.0)
+            numpy.maximum(cover[top:bottom, left:right], value,
+                          out=cover[top:bottom, left:right])
+        return cover.ravel().tolist()
+
+    cover = [0.0] * (width * height)
+    for (x0, y0), (x1, y1) in segments:
+        left, right, top, bottom = _bounds(x0, y0, x1, y1, radius, width, height)
+        dx, dy = x1 - x0, y1 - y0
+        length = dx * dx + dy * dy
+        for y in range(top, bottom):
+            py = y + 0.5
+            for x in range(left, right):
+                px = x + 0.5
+                t = 0.0
+                if length:
+                    t = min(1.0, max(0.0, ((px - x0) * dx + (py - y0) * dy) / length))
+                distance = math.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+                value = radius + 0.5 - distance
+                if value > cover[y * width + x]:
+                    cover[y * width + x] = min(1.0, value)
+    return cover
+
+
+def _bounds(x0, y0, x1, y1, radius, width, height):
+    pad = radius + 1.0
+    left = max(0, int(math.floor(min(x0, x1) - pad)))
+    right = min(width, int(math.ceil(max(x0, x1) + pad)))
+    top = max(0, int(math.floor(min(y0, y1) - pad)))
+    bottom = min(height, int(math.ceil(max(y0, y1) + pad)))
+    return left, right, top, bottom
+
+
+def render(definition, width=32, height=32, view="iso", color=COLOR,
+           lineWidth=LINE_WIDTH):
+    """Return the RGBA pixels of the icon of a shape.
+
+    Args:
+        definition (list): curve definitions of the shape
+        width (int): icon width
+        height (int): icon height
+        view (string): "iso", "top", "front" or "side"
+        color (tuple): RGB line color from 0 to 255
+        lineWidth (float): line width in pixels
+
+    Returns:
+        bytearray: flat RGBA pixels on a transparent background
+    """
+    polylines = [project(evaluate(curve), view) for curve in definition]
+    cover = coverage(fit(polylines, width, height), width, height, lineWidth)
+
+    pixels = bytearray(width * height * 4)
+    r, g, b = color
+    for i, value in enumerate(cover):
+        if value > 0.0:
+            pixels[i * 4:i * 4 + 4] = bytearray([r, g, b, int(value * 255 + 0.5)])
+        else:
+            pixels[i * 4:i * 4 + 3] = bytearray([255, 255, 255])
+    return pixels
+
+
+def write_icon(definition, path, width=32, height=32, view="iso"):
+    """Draw the icon of a shape into a png file.
+    """
+    dirName = os.path.dirname(path)
+    if dirName and not os.path.isdir(dirName):
+        os.makedirs(dirName)
+    pngio.write(path, width, height, render(definition, width, height, view))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Draw icons of curve shapes.")
+    parser.add_argument("shapes", help="binary or json shape file")
+    parser.add_argument("output", help="directory to write the icons to")
+    parser.add_argument("--view", default="iso", choices=VIEWS)
+    parser.add_argument("--size", type=int, default=32, help="icon size in pixels")
+    args = parser.parse_args(argv)
+
+    definitions = curvedata.load_file(args.shapes)
+    for name in sorted(definitions):
+        path = os.path.join(args.output, "{}.png".format(name))
+        write_icon(definitions[name], path, args.size, args.size, args.view)
+        print("drawn: {}".format(path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
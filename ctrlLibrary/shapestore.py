@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Shape library store.
+
+Every shape registered by the artists is kept in one file instead of one
+file per shape, so that a library on network storage is read without
+scanning a directory or opening a file per shape.
+
+    header:  magic "CLIB", version (uint16), index offset (uint64),
+             index size (uint32)
+    records: one curvedata binary block per shape version
+    index:   json, name -> offset, size, tab, tabIndex, layoutIndex, icon,
+             time of the last write
+
+Writes only append: the new record and a new index are written at the end
+of the file and the header is pointed at the new index last. Replaced
+records and old indices are dropped by compact(), run once they take more
+space than the live data. Writers hold the lock of the store, readers do
+not lock.
+
+================================================="""
+
+# Standard Modules
+import os
+import json
+import mmap
+import time
+import struct
+from collections import OrderedDict
+
+try:
+    from . import curvedata
+    from . import fileutil
+except (ImportError, ValueError):
+    # run as a script outside of Maya
+    import curvedata
+    import fileutil
+
+
+MAGIC = b"CLIB"
+VERSION = 1
+ENV_STORE = "CTRL_LIBRARY_SHAPE_STORE"
+FILE_NAME = "shapeLibrary.clib"
+COMPACT_SIZE = 64 * 1024
+
+_HEADER = struct.Struct("<4sHQI")
+
+
+def get_store_path():
+    dirName = os.path.dirname(os.path.abspath(__file__))
+    default = os.path.join(dirName, "data", FILE_NAME)
+    return os.environ.get(ENV_STORE) or default
+
+
+class ShapeStore():
+    """Single file store of shape definitions and their icon layout slot.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_store_path()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def stamp(self):
+        """Return the modification time and size of the store, or None when
+        there is no store yet.
+        """
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return None
+        return [info.st_mtime, info.st_size]
+
+    def read_index(self):
+        """Return (entries, garbage) of the store, entries being name ->
+        offset, size, tab, tabIndex, layoutIndex and icon.
+        """
+        if not self.exists():
+            return OrderedDict(), 0
+        with open(self.path, "rb") as f:
+            return self._read_index(f)
+
+    def entries(self):
+        return self.read_index()[0]
+
+    def names(self):
+        return list(self.entries().keys())
+
+    def get(self, name):
+        """Return the curve definitions of a shape.
+
+        The index and the record are read through the same handle, so a
+        compaction replacing the store in between can not move the record.
+        """
+        with open(self.path, "rb") as f:
+            entry = self._read_index(f)[0][name]
+            f.seek(entry["offset"])
+            return self._decode(f.read(entry["size"]))[name]
+
+    def load_all(self):
+        """Return name -> curve definitions of every shape of the store,
+        read with a single memory mapped read.
+        """
+        if not self.exists():
+            return {}
+        definitions = {}
+        with open(self.path, "rb") as f:
+            entries = self._read_index(f)[0]
+            if not entries:
+                return {}
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for name, entry in entries.items():
+                    definitions.update(self._decode(data, entry["offset"]))
+            finally:
+                data.close()
+        return definitions
+
+    def put(self, name, definition, tab=None, tabIndex=1, layoutIndex=None,
+            icon=None):
+        """Append a shape to the store, replacing any shape with the same
+        name.
+
+        Args:
+            name (string): shape ID
+            definition (list): curve definitions
+            tab (string): icon tab of the shape
+            tabIndex (int): sub-tab of the shape
+            layoutIndex (int): slot in the sub-tab, the slot of the shape
+                it replaces or after the last one of the store by default
+            icon (string): icon path, relative to icon/controller when
+                the icon lives in the library
+
+        Returns:
+            dict: index entry of the shape
+        """
+        with fileutil.lock(self.path):
+            entry, compact = self._put(name, definition, tab, tabIndex,
+                                       layoutIndex, icon)
+            if compact:
+                self._compact()
+        return entry
+
+    def _put(self, name, definition, tab, tabIndex, layoutIndex, icon):
+        entries, garbage = self.read_index()
+        previous = entries.get(name)
+        if layoutIndex is None and previous and previous["tab"] == tab:
+            tabIndex = previous["tabIndex"]
+            layoutIndex = previous["layoutIndex"]
+        elif layoutIndex is None:
+            slots = [e["layoutIndex"] for e in entries.values()
+                     if e["tab"] == tab and e["tabIndex"] == tabIndex]
+            layoutIndex = max(slots) + 1 if slots else 1
+
+        record = curvedata.encode({name: definition})
+        mode = "r+b" if self.exists() else "w+b"
+        with open(self.path, mode) as f:
+            if mode == "w+b":
+                f.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+                oldIndexSize = 0
+            else:
+                oldIndexSize = self._read_header(f)[1]
+
+            f.seek(0, 2)
+            old = entries.pop(name, None)
+            entries[name] = {"offset": f.tell(),
+                             "size": len(record),
+                             "tab": tab,
+                             "tabIndex": tabIndex,
+                             "layoutIndex": layoutIndex,
+                             "icon": icon,
+                             "time": time.time()}
+            garbage += oldIndexSize + (old["size"] if old else 0)
+            f.write(record)
+            self._write_index(f, entries, garbage)
+
+        compact = garbage > COMPACT_SIZE and garbage > self._live_size(entries)
+        return entries[name], compact
+
+    def remove(self, name):
+        with fileutil.lock(self.path):
+            entries, garbage = self.read_index()
+            if name not in entries:
+                return False
+            with open(self.path, "r+b") as f:
+                oldIndexSize = self._read_header(f)[1]
+                garbage += oldIndexSize + entries.pop(name)["size"]
+                f.seek(0, 2)
+                self._write_index(f, entries, garbage)
+        return True
+
+    def compact(self):
+        """Rewrite the store with only its live records.
+        """
+        with fileutil.lock(self.path):
+            self._compact()
+
+    def _compact(self):
+        # read every live record first, the store can not be replaced while
+        # it is open on Windows
+        entries = self.entries()
+        records = []
+        with open(self.path, "rb") as source:
+            for name, entry in entries.items():
+                source.seek(entry["offset"])
+                records.append(source.read(entry["size"]))
+
+        with fileutil.atomic_write(self.path, "w+b") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+            for entry, record in zip(entries.values(), records):
+                entry["offset"] = f.tell()
+                f.write(record)
+            self._write_index(f, entries, 0)
+
+    def layout_entries(self):
+        """Return name -> [tab, tabIndex, layoutIndex, icon] of every shape
+        placed in a tab.
+        """
+        return OrderedDict((name, [e["tab"], e["tabIndex"], e["layoutIndex"], e["icon"]])
+                           for name, e in self.entries().items() if e["tab"])
+
+    def modified_times(self):
+        """Return name -> time each shape was last written.
+        """
+        return dict((name, e.get("time", 0)) for name, e in self.entries().items())
+
+    def _read_index(self, f):
+        offset, size = self._read_header(f)
+        f.seek(offset)
+        try:
+            index = json.loads(f.read(size).decode("utf-8"),
+                               object_pairs_hook=OrderedDict)
+        except UnicodeDecodeError:
+            raise ValueError("damaged shape library index: {}".format(self.path))
+        return index["shapes"], index["garbage"]
+
+    def _decode(self, data, offset=0):
+        try:
+            return curvedata.decode(data, offset)
+        except struct.error:
+            raise ValueError("damaged shape library record: {}".format(self.path))
+
+    def _read_header(self, f):
+        f.seek(0)
+        try:
+            magic, version, offset, size = _HEADER.unpack(f.read(_HEADER.size))
+        except struct.error:
+            raise ValueError("not a shape library store: {}".format(self.path))
+        if magic != MAGIC:
+            raise ValueError("not a shape library store: {}".format(self.path))
+        if version != VERSION:
+            raise ValueError("unsupported shape library version {}".format(version))
+        return offset, size
+
+    def _write_index(self, f, entries, garbage):
+        """Write the index at the current position, then point the header
+        at it once it is on disk.
+        """
+        data = json.dumps({"shapes": entries, "garbage": garbage},
+                          separators=(",", ":")).encode("utf-8")
+        offset = f.tell()
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, offset, len(data)))
+        f.flush()
+
+    def _live_size(self, entries):
+        return sum(entry["size"] for entry in entries.values())
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+u"""=================================================
+Tests of the modules of the library that run without Maya.
+
+The package itself imports pymel, so the modules are imported on their
+own from the package directory, as batch.py does outside of Maya.
+
+================================================="""
+
+# Standard Modules
+import os
+import sys
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "ctrlLibrary"))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+
+import batch
+
+
+STUB_WORKER = """
+import sys
+import json
+
+with open(sys.argv[1], "r") as f:
+    spec = json.load(f)
+if spec.get("scene") == "broken.ma":
+    sys.stderr.write("could not open broken.ma")
+    sys.exit(1)
+
+icons = spec.get("icons", {}).get("jobs", [])
+report = {"controls": [[node] for node in spec.get("controls", [])],
+          "icons": [path for name, path in icons if name != "unknown"],
+          "missing": [name for name, path in icons if name == "unknown"]}
+with open(sys.argv[3], "w") as f:
+    json.dump(report, f)
+"""
+
+
+def write_stub(tmp_path):
+    path = tmp_path / "stub_worker.py"
+    path.write_text(STUB_WORKER)
+    return str(path)
+
+
+def test_manifest_report(tmp_path):
+    manifest = {"controls": ["hip_JNT"],
+                "jobs": [{"scene": "a.ma"},
+                         {"scene": "broken.ma"},
+                         {"scene": "c.ma", "controls": ["arm_JNT", "leg_JNT"]}]}
+    report = batch.run_manifest(manifest, workers=2,
+                                interpreter=sys.executable,
+                                script=write_stub(tmp_path))
+
+    assert report["failed"] == 1
+    jobs = report["jobs"]
+    assert [job["scene"] for job in jobs] == ["a.ma", "broken.ma", "c.ma"]
+    assert [job["ok"] for job in jobs] == [True, False, True]
+    assert "broken.ma" in jobs[1]["error"]
+    assert jobs[2]["controls"] == [["arm_JNT"], ["leg_JNT"]]
+
+
+def test_icon_manifest_counts_missing_shapes(tmp_path):
+    jobs = [["a", "a.png"], ["unknown", "b.png"], ["c", "c.png"], ["unknown", "d.png"]]
+    manifest = batch.get_icon_manifest(jobs, 2, size=48)
+    assert [job["icons"]["width"] for job in manifest["jobs"]] == [48, 48]
+
+    report = batch.run_manifest(manifest, workers=2,
+                                interpreter=sys.executable,
+                                script=write_stub(tmp_path))
+    assert report["failed"] == 2
+    assert [job["ok"] for job in report["jobs"]] == [True, False]
+
+
+def test_draw_icons_counts_missing_shapes(tmp_path, monkeypatch):
+    monkeypatch.setenv("MAYA_APP_DIR", str(tmp_path / "maya"))
+    monkeypatch.setenv("CTRL_LIBRARY_SHAPE_STORE", str(tmp_path / "shapes.clib"))
+    report = batch.draw_icons([["unknown", str(tmp_path / "unknown.png")]])
+    assert report["failed"] == 1
+    assert report["jobs"][0]["missing"] == ["unknown"]
+
+
+def test_write_report(tmp_path):
+    path = str(tmp_path / "report.json")
+    batch.write_report({"failed": 0}, path)
+    with open(path, "r") as f:
+        assert json.load(f) == {"failed": 0}
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import curvedata
+
+
+def make_definitions():
+    square = curvedata.make_curve(1, curvedata.OPEN, [0, 1, 2, 3, 4],
+                                  [[-1, 0, -1], [1, 0, -1], [1, 0, 1],
+                                   [-1, 0, 1], [-1, 0, -1]])
+    circle = curvedata.make_curve(3, curvedata.PERIODIC,
+                                  [-2, -1, 0, 1, 2, 3, 4, 5, 6, 7, 8],
+                                  [[0.5, 0, 0.25]] * 8 + [[0, 0, 0]])
+    return {"square": [square], "circleSquare": [circle, square]}
+
+
+def test_binary_round_trip():
+    definitions = make_definitions()
+    assert curvedata.decode(curvedata.encode(definitions)) == definitions
+
+
+def test_decode_at_offset():
+    definitions = make_definitions()
+    data = b"padding" + curvedata.encode(definitions)
+    assert curvedata.decode(data, len(b"padding")) == definitions
+
+
+def test_binary_and_json_files(tmp_path):
+    definitions = make_definitions()
+    binaryPath = str(tmp_path / ("shapes" + curvedata.BINARY_EXT))
+    jsonPath = str(tmp_path / ("shapes" + curvedata.JSON_EXT))
+    curvedata.dump_binary(definitions, binaryPath)
+    curvedata.dump(definitions, jsonPath)
+    assert curvedata.load_file(binaryPath) == definitions
+    assert curvedata.load_file(jsonPath) == definitions
+
+
+def test_cache_stamp(tmp_path):
+    path = str(tmp_path / "shapeCache.json")
+    curvedata.dump_cache(make_definitions(), path, [1.0, 2])
+    assert curvedata.load_cache(path, [1.0, 2]) == make_definitions()
+    assert curvedata.load_cache(path, [1.0, 3]) is None
+    assert curvedata.load_cache(str(tmp_path / "missing.json")) is None
+
+
+def test_same_knots():
+    assert curvedata.same_knots([0, 1, 2], [0, 1, 2 + 1e-9])
+    assert not curvedata.same_knots([0, 1, 2], [0, 1, 3])
+    assert not curvedata.same_knots([0, 1], [0, 1, 2])
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import threading
+
+import pytest
+
+import fileutil
+
+
+def test_lock_serializes_writers(tmp_path):
+    path = str(tmp_path / "counter.json")
+    with open(path, "w") as f:
+        json.dump(0, f)
+
+    def increment():
+        for i in range(20):
+            with fileutil.lock(path):
+                with open(path, "r") as f:
+                    value = json.load(f)
+                with fileutil.atomic_write(path) as f:
+                    json.dump(value + 1, f)
+
+    threads = [threading.Thread(target=increment) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path, "r") as f:
+        assert json.load(f) == 120
+    assert not os.path.exists(fileutil.get_lock_path(path))
+
+
+def test_lock_timeout(tmp_path):
+    path = str(tmp_path / "held.json")
+    with fileutil.lock(path):
+        start = time.time()
+        with pytest.raises(fileutil.LockError):
+            with fileutil.lock(path, timeout=0.2):
+                pass
+        assert time.time() - start < 5
+
+
+def test_lock_unwritable_directory(tmp_path):
+    path = str(tmp_path / "missing" / "x.json")
+    with pytest.raises(fileutil.LockError):
+        with fileutil.lock(path, timeout=0.2):
+            pass
+
+
+def test_stale_lock_is_broken(tmp_path):
+    path = str(tmp_path / "stale.json")
+    lockPath = fileutil.get_lock_path(path)
+    with open(lockPath, "w") as f:
+        f.write("otherhost:1:token")
+    os.utime(lockPath, (0, 0))
+    with fileutil.lock(path, timeout=1):
+        with open(lockPath, "r") as f:
+            assert f.read().startswith(socket.gethostname())
+
+
+def test_atomic_write_keeps_target_on_error(tmp_path):
+    path = str(tmp_path / "data.json")
+    with open(path, "w") as f:
+        f.write("old")
+    with pytest.raises(RuntimeError):
+        with fileutil.atomic_write(path) as f:
+            f.write("new")
+            raise RuntimeError()
+    with open(path, "r") as f:
+        assert f.read() == "old"
+    assert os.listdir(str(tmp_path)) == ["data.json"]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import layout
+
+
+def make_data():
+    return {"3D": {"indexOrder": 2,
+                   "numberOfTab": 1,
+                   "contents": {"cube": {"path": "3d/cube.png",
+                                         "tabIndex": 1, "layoutIndex": 1}}},
+            "2D": {"indexOrder": 1,
+                   "numberOfTab": 2,
+                   "contents": {"square": {"path": "2d/square.png",
+                                           "tabIndex": 1, "layoutIndex": 2},
+                                "circle": {"path": "C:/lib/icon/controller/2d/circle.png",
+                                           "tabIndex": 1, "layoutIndex": 1},
+                                "arrow": {"path": "2d/arrow.png",
+                                          "tabIndex": 2, "layoutIndex": 1},
+                                "cross": {"path": "2d/cross.png",
+                                          "tabIndex": 1, "layoutIndex": 2}}}}
+
+
+def test_build_index_order():
+    tabs = layout.build_index(make_data())
+    assert [tab[0] for tab in tabs] == ["2D", "3D"]
+    subTabs = tabs[0][2]
+    assert [subTab[0] for subTab in subTabs] == [1, 2]
+    assert [slot[0] for slot in subTabs[0][1]] == ["circle", "cross", "square"]
+    assert subTabs[0][1][0][1] == "2d/circle.png"
+
+
+def test_build_index_collisions():
+    collisions = []
+    layout.build_index(make_data(), collisions)
+    assert collisions == [["2D", 1, 2, "square"]]
+
+
+def test_next_slot():
+    tabs = layout.build_index(make_data())
+    assert layout.next_slot(tabs, "2D") == (2, 2)
+    assert layout.next_slot(tabs, "Other") == (1, 1)
+
+
+def test_add_entries():
+    data = layout.add_entries(make_data(), {"star": ["Custom", 1, 1, "custom/star.png"]})
+    tabs = layout.build_index(data)
+    assert [tab[0] for tab in tabs] == ["2D", "3D", "Custom"]
+    assert "star" not in make_data()["2D"]["contents"]
+
+
+def test_index_cache(tmp_path):
+    sourcePath = str(tmp_path / "iconLayout.json")
+    cachePath = str(tmp_path / "iconLayout.cache.json")
+    with open(sourcePath, "w") as f:
+        f.write("{}")
+    tabs = layout.build_index(make_data())
+    layout.save_index(tabs, cachePath, sourcePath, [1.0, 2])
+    assert layout.load_index(cachePath, sourcePath, [1.0, 2]) == tabs
+    assert layout.load_index(cachePath, sourcePath, [1.0, 3]) is None
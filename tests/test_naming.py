@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import naming
+
+
+def allocate_all(names):
+    allocator = naming.NameAllocator(["arm_CON", "arm_CON1"])
+    return [allocator.allocate(name) for name in names]
+
+
+def test_allocator_is_deterministic():
+    names = ["arm_CON", "arm_CON", "leg_CON", "leg_CON", "arm_CON"]
+    assert allocate_all(names) == allocate_all(names)
+    assert allocate_all(names) == ["arm_CON2", "arm_CON3", "leg_CON",
+                                   "leg_CON1", "arm_CON4"]
+
+
+def test_allocator_template():
+    allocator = naming.NameAllocator(["arm_ctrl"])
+    assert allocator.allocate("arm_ctrl", "arm_ctrlBatting@") == "arm_ctrlBatting1"
+    assert allocator.allocate("arm_ctrl", "arm_ctrlBatting@") == "arm_ctrlBatting2"
+
+
+def test_derive():
+    rules = naming.NamingRules()
+    assert rules.derive_all(["arm_JNT", "hip"], "ReelFX") == ["arm_CON", "hip_CON"]
+
+
+def test_config_keeps_builtin_conventions():
+    rules = naming.NamingRules(conventions={
+        "Studio": [{"pattern": "^(.*)$", "replace": "\\1_ctl"}]})
+    assert rules.conventions() == ["ReelFX", "Studio"]
+    assert rules.derive("arm", "Studio") == "arm_ctl"
+    assert rules.derive("arm_JNT", "ReelFX") == "arm_CON"
+
+
+def test_unknown_convention():
+    with pytest.raises(ValueError):
+        naming.NamingRules().derive("arm", "Missing")
+
+
+def test_classify():
+    rules = naming.NamingRules()
+    assert rules.classify(["arm_L_JNT", "R_leg", "spine_M", "head"]) == [
+        "left", "right", "center", None]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+import pngio
+import raster
+import curvedata
+
+
+SQUARE = [curvedata.make_curve(1, curvedata.OPEN, [0, 1, 2, 3, 4],
+                               [[-1, 0, -1], [1, 0, -1], [1, 0, 1],
+                                [-1, 0, 1], [-1, 0, -1]])]
+
+
+def test_render_draws_lines():
+    for view in raster.VIEWS:
+        pixels = raster.render(SQUARE, 16, 24, view)
+        assert len(pixels) == 16 * 24 * 4
+    pixels = raster.render(SQUARE, 16, 16, "top")
+    alpha = pixels[3::4]
+    assert any(alpha)
+    assert not all(alpha)
+
+
+def test_write_icon(tmp_path):
+    path = str(tmp_path / "2d" / "square.png")
+    raster.write_icon(SQUARE, path, 20, 20, "top")
+    width, height, pixels = pngio.read(path)
+    assert (width, height) == (20, 20)
+    assert pixels == raster.render(SQUARE, 20, 20, "top")
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import curvedata
+import shapestore
+
+
+def make_definition(size):
+    return [curvedata.make_curve(1, curvedata.OPEN, list(range(size)),
+                                 [[i, 0, 0] for i in range(size)])]
+
+
+def test_put_and_get(tmp_path):
+    store = shapestore.ShapeStore(str(tmp_path / "shapes.clib"))
+    assert not store.exists()
+    assert store.load_all() == {}
+
+    store.put("a", make_definition(4), tab="2D")
+    store.put("b", make_definition(5), tab="2D")
+    assert store.get("a") == make_definition(4)
+    assert store.load_all() == {"a": make_definition(4), "b": make_definition(5)}
+    assert store.entries()["b"]["layoutIndex"] == 2
+
+
+def test_replace_keeps_slot(tmp_path):
+    store = shapestore.ShapeStore(str(tmp_path / "shapes.clib"))
+    store.put("a", make_definition(4), tab="2D", tabIndex=2, layoutIndex=7)
+    store.put("a", make_definition(6), tab="2D")
+    entry = store.entries()["a"]
+    assert (entry["tabIndex"], entry["layoutIndex"]) == (2, 7)
+    assert store.get("a") == make_definition(6)
+
+
+def test_remove(tmp_path):
+    store = shapestore.ShapeStore(str(tmp_path / "shapes.clib"))
+    store.put("a", make_definition(4))
+    assert store.remove("a")
+    assert not store.remove("a")
+    assert store.names() == []
+
+
+def test_compact(tmp_path):
+    path = str(tmp_path / "shapes.clib")
+    store = shapestore.ShapeStore(path)
+    for i in range(10):
+        store.put("a", make_definition(50 + i))
+    store.put("b", make_definition(3))
+    size = os.path.getsize(path)
+
+    store.compact()
+    assert os.path.getsize(path) < size
+    assert store.read_index()[1] == 0
+    assert store.load_all() == {"a": make_definition(59), "b": make_definition(3)}
+
+
+def test_compact_on_put(tmp_path, monkeypatch):
+    monkeypatch.setattr(shapestore, "COMPACT_SIZE", 0)
+    store = shapestore.ShapeStore(str(tmp_path / "shapes.clib"))
+    store.put("a", make_definition(60))
+    store.put("a", make_definition(4))
+    assert store.read_index()[1] == 0
+    assert store.get("a") == make_definition(4)
+
+
+def test_damaged_store(tmp_path):
+    path = str(tmp_path / "shapes.clib")
+    store = shapestore.ShapeStore(path)
+    store.put("a", make_definition(4))
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:10])
+    with pytest.raises(ValueError):
+        store.entries()